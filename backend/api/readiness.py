@@ -0,0 +1,66 @@
+"""Startup progress tracking for the liveness and readiness probes"""
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+
+class StartupTracker:
+    """Records the stages of a background startup and how long each took.
+
+    Stages run in order (e.g. loading_model, warming_up); the service is
+    ready only once `ready()` is called, and failed if `fail()` is.
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.stage = "starting"
+        self.stages: List[Dict[str, Any]] = []
+        self.warmup: List[Dict[str, Any]] = []
+        self.error: Optional[str] = None
+        self._stage_started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @property
+    def is_ready(self) -> bool:
+        return self.stage == "ready"
+
+    @property
+    def is_failed(self) -> bool:
+        return self.stage == "failed"
+
+    def begin(self, stage: str):
+        with self._lock:
+            self._close_stage()
+            self.stage = stage
+
+    def ready(self):
+        with self._lock:
+            self._close_stage()
+            self.stage = "ready"
+
+    def fail(self, error: Exception):
+        with self._lock:
+            self._close_stage()
+            self.stage = "failed"
+            self.error = f"{type(error).__name__}: {error}"
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            report = {
+                "stage": self.stage,
+                "ready": self.stage == "ready",
+                "uptime_seconds": round(time.time() - self.started_at, 1),
+                "completed_stages": list(self.stages),
+                "warmup": list(self.warmup),
+            }
+            if self.stage not in ("ready", "failed"):
+                report["stage_seconds"] = round(time.perf_counter() - self._stage_started, 1)
+            if self.error:
+                report["error"] = self.error
+            return report
+
+    def _close_stage(self):
+        now = time.perf_counter()
+        if self.stage not in ("ready", "failed"):
+            self.stages.append({"stage": self.stage, "seconds": round(now - self._stage_started, 3)})
+        self._stage_started = now
@@ -1,13 +1,22 @@
+import json
 import logging
 import os
-from typing import Optional
+import threading
+import time
+from typing import List, Optional
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 import uvicorn
 from dotenv import load_dotenv
 
+from api.readiness import StartupTracker
 from src.agent.core import MathAgent
+from src.agent.executor import AgentExecutor
+from src.agent.sessions import SessionStore
+from src.output.formatter import clean_latex
+from src.tools.tool_cache import tool_cache
 
 load_dotenv()
 
@@ -28,37 +37,135 @@ app.add_middleware(
 # Global Agent
 agent = None
 
-@app.on_event("startup")
-async def startup_event():
+# Blocking agent stages run here so the event loop stays responsive
+executor = AgentExecutor(
+    inference_slots=int(os.getenv("INFERENCE_SLOTS", "4")),
+    io_workers=int(os.getenv("IO_WORKERS", "8"))
+)
+
+# Startup stages, reported by /health/ready
+startup = StartupTracker()
+
+def load_agent():
+    """Load the model and warm it up; traffic is accepted only after both"""
     global agent
-    logger.info("🚀 Initializing Math Agent...")
     try:
-        agent = MathAgent()
+        startup.begin("loading_model")
+        logger.info("🚀 Initializing Math Agent...")
+        loaded = MathAgent(sessions=SessionStore(
+            max_sessions=int(os.getenv("MAX_SESSIONS", "1000")),
+            ttl_seconds=float(os.getenv("SESSION_TTL_SECONDS", "3600"))
+        ))
+        
+        lengths = [int(n) for n in os.getenv("WARMUP_PROMPT_LENGTHS", "64,256,1024").split(",") if n.strip()]
+        if lengths:
+            startup.begin("warming_up")
+            startup.warmup = loaded.worker.warmup(
+                prompt_lengths=lengths,
+                max_new_tokens=int(os.getenv("WARMUP_NEW_TOKENS", "16"))
+            )
+        
+        agent = loaded
+        startup.ready()
         logger.info("✅ Math Agent initialized!")
     except Exception as e:
+        startup.fail(e)
         logger.error(f"❌ Failed to start agent: {e}")
 
+@app.on_event("startup")
+async def startup_event():
+    # Loading takes minutes; the server keeps answering the health probes meanwhile
+    threading.Thread(target=load_agent, name="agent-startup", daemon=True).start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    executor.shutdown()
+
 # Simple Request Model (No Files)
 class SolveRequest(BaseModel):
     problem: str
     max_tokens: Optional[int] = 2048
     temperature: Optional[float] = 0.7
+    allow_cached: Optional[bool] = None  # Reuse cached sampled solutions; defaults to SOLUTION_CACHE_ALLOW_SAMPLED
+    session_id: Optional[str] = None
+    adapter: Optional[str] = None  # LoRA adapter name; defaults to the startup adapter
+
+class BatchSolveRequest(BaseModel):
+    problems: List[str]
+    max_tokens: Optional[int] = 2048
+    temperature: Optional[float] = 0.7
+    allow_cached: Optional[bool] = None
+    use_tools: Optional[bool] = None
+    adapter: Optional[str] = None
+
+class ResetRequest(BaseModel):
+    session_id: Optional[str] = None
+
+class AdapterRequest(BaseModel):
+    name: str
+    path: str
+
+def require_agent():
+    """Reject requests until the model is loaded and warmed up"""
+    if agent is None:
+        detail = "Agent failed to start" if startup.is_failed else f"Agent is not ready yet ({startup.stage})"
+        raise HTTPException(status_code=503, detail=detail)
+
+def check_adapter(name: Optional[str]):
+    """Reject unknown adapter names before any work is queued"""
+    try:
+        agent.worker.model_wrapper.resolve_adapter(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/")
 async def root():
-    return {"status": "healthy", "service": "Math Solver Agent API"}
+    status = "healthy" if startup.is_ready else startup.stage
+    return {"status": status, "service": "Math Solver Agent API"}
+
+@app.get("/health/live")
+async def health_live():
+    """Liveness: the process is serving; fails only if startup failed for good"""
+    if startup.is_failed:
+        return JSONResponse(status_code=503, content={"alive": False, "error": startup.error})
+    return {"alive": True, "stage": startup.stage}
+
+@app.get("/health/ready")
+async def health_ready():
+    """Readiness: model loaded and warmed up, with stage and warmup timings"""
+    return JSONResponse(status_code=200 if startup.is_ready else 503, content=startup.report())
+
+@app.get("/stats")
+async def stats():
+    """Queue depth of the executor pools and generation throughput"""
+    result = {"executor": executor.stats()}
+    if agent:
+        result["sessions"] = agent.sessions.stats()
+        result["solution_cache"] = agent.worker.solution_cache.stats()
+        result["router"] = agent.router_stats()
+        result["tool_cache"] = tool_cache.stats()
+    if agent and agent.worker.scheduler:
+        result["scheduler"] = agent.worker.scheduler.stats()
+    return result
 
 @app.post("/solve")
 async def solve_problem(request: SolveRequest):
-    global agent
-    if not agent:
-        raise HTTPException(status_code=500, detail="Agent not initialized")
+    require_agent()
+    check_adapter(request.adapter)
     
     try:
         logger.info(f"📩 Received input: {request.problem}")
         
-        # Run Agent directly with text
-        response_text = agent.run(request.problem, max_tokens=request.max_tokens)
+        # Router and generation run on the executor pools, not the event loop
+        response_text = await agent.run_async(
+            request.problem,
+            executor,
+            max_tokens=request.max_tokens,
+            session_id=request.session_id,
+            adapter=request.adapter,
+            temperature=request.temperature,
+            allow_cached=request.allow_cached
+        )
         
         return {"response": response_text}
 
@@ -66,15 +173,114 @@ async def solve_problem(request: SolveRequest):
         logger.error(f"Error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/reset")
-async def reset_memory():
-    global agent
+@app.post("/solve/batch")
+async def solve_problem_batch(request: BatchSolveRequest):
+    """Solve a whole problem set in shared generation batches (no routing or session history)"""
+    require_agent()
+    check_adapter(request.adapter)
+    max_problems = int(os.getenv("MAX_BATCH_PROBLEMS", "64"))
+    if not request.problems or len(request.problems) > max_problems:
+        raise HTTPException(status_code=400, detail=f"Send between 1 and {max_problems} problems")
+    
+    logger.info(f"📩 Received batch of {len(request.problems)} problems")
+    started = time.perf_counter()
     try:
-        agent = MathAgent() #if you want wolfram, add enable_wolfram=True, wolfram_api_key=os.getenv('WOLFRAM_API_KEY')
-        logger.info("🧹 Agent memory wiped!")
-        return {"status": "memory_cleared"}
+        results = await executor.run_inference(
+            agent.worker.solve_batch,
+            request.problems,
+            max_tokens=request.max_tokens,
+            temperature=request.temperature,
+            use_tools=request.use_tools,
+            adapter=request.adapter,
+            allow_cached=request.allow_cached
+        )
     except Exception as e:
+        logger.error(f"Error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    
+    return {
+        "results": [
+            {
+                "problem": problem,
+                "response": clean_latex(result["solution"]),
+                "final_answer": result["final_answer"],
+                "tools_used": result["tools_used"],
+                "cached": result.get("cached", False),
+                "seconds": result["seconds"]
+            }
+            for problem, result in zip(request.problems, results)
+        ],
+        "seconds": round(time.perf_counter() - started, 3)
+    }
+
+def format_sse(event: dict) -> str:
+    """Serialize an agent event as a server-sent event"""
+    return f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+@app.post("/solve/stream")
+async def solve_problem_stream(request: SolveRequest):
+    require_agent()
+    check_adapter(request.adapter)
+    
+    logger.info(f"📩 Received streaming input: {request.problem}")
+
+    def event_stream():
+        try:
+            for event in agent.run_stream(
+                request.problem,
+                max_tokens=request.max_tokens,
+                executor=executor,
+                session_id=request.session_id,
+                adapter=request.adapter,
+                temperature=request.temperature,
+                allow_cached=request.allow_cached
+            ):
+                yield format_sse(event)
+        except Exception as e:
+            logger.error(f"Error: {str(e)}")
+            yield format_sse({"type": "error", "detail": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/reset")
+async def reset_memory(request: Optional[ResetRequest] = None):
+    require_agent()
+    # Only this session's history is dropped; the model stays loaded
+    session_id = request.session_id if request else None
+    agent.reset(session_id)
+    logger.info(f"🧹 Session memory wiped: {session_id or 'default'}")
+    return {"status": "memory_cleared", "session_id": session_id}
+
+@app.get("/adapters")
+async def list_adapters():
+    require_agent()
+    model_wrapper = agent.worker.model_wrapper
+    return {"adapters": model_wrapper.list_adapters(), "default": model_wrapper.default_adapter}
+
+@app.post("/adapters")
+async def load_adapter(request: AdapterRequest):
+    require_agent()
+    try:
+        # Loading reads weights from disk; keep it off the event loop
+        await executor.run_io(agent.worker.model_wrapper.load_adapter, request.name, request.path)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "loaded", "adapter": request.name}
+
+@app.delete("/adapters/{name}")
+async def unload_adapter(name: str):
+    require_agent()
+    try:
+        await executor.run_io(agent.worker.model_wrapper.unload_adapter, name)
+    except ValueError as e:
+        # Known adapters that cannot be unloaded (merged weights) are a bad request
+        status_code = 400 if name in agent.worker.model_wrapper.list_adapters() else 404
+        raise HTTPException(status_code=status_code, detail=str(e))
+    return {"status": "unloaded", "adapter": name}
 
 if __name__ == "__main__":
     uvicorn.run("api.server:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -0,0 +1,172 @@
+"""Checks PooledHttpClient and WolframAlphaTool against a local stub HTTP server.
+
+Starts an http.server on localhost and verifies keep-alive connection
+reuse, retries on 5xx, response caching, the circuit breaker opening and
+half-opening, and a Wolfram Alpha query served by the stub.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.tools.http_client import PooledHttpClient, CircuitBreaker, CircuitOpenError, HttpStatusError
+from src.tools.tool_cache import ToolCache, MemoryCacheBackend
+from src.tools.wolfram_alpha import WolframAlphaTool
+
+WOLFRAM_RESPONSE = {
+    "queryresult": {
+        "success": True,
+        "timing": 0.1,
+        "pods": [{"title": "Result", "subpods": [{"plaintext": "125/3"}]}],
+    }
+}
+
+
+class StubState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = {}           # Path -> request count
+        self.client_ports = []   # Source port of every request, to spot new connections
+        self.flaky_failures = 0  # /flaky answers 503 this many more times
+        self.down = True         # /down answers 500 while set
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep connections open between requests
+    state: StubState = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        state = self.state
+        with state.lock:
+            state.hits[url.path] = state.hits.get(url.path, 0) + 1
+            state.client_ports.append(self.client_address[1])
+            if url.path == "/flaky" and state.flaky_failures > 0:
+                state.flaky_failures -= 1
+                status = 503
+            elif url.path == "/down" and state.down:
+                status = 500
+            else:
+                status = 200
+
+        body = {"path": url.path, "params": parse_qs(url.query)}
+        if url.path == "/v2/query":
+            body = WOLFRAM_RESPONSE
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub():
+    state = StubState()
+    handler = type("Handler", (StubHandler,), {"state": state})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+def make_client(name, **kwargs):
+    return PooledHttpClient(
+        name=name,
+        timeout=5,
+        backoff_seconds=0.01,
+        cache=ToolCache([MemoryCacheBackend()]),
+        **kwargs
+    )
+
+
+def check(label, condition):
+    print(f"{'✅' if condition else '❌'} {label}")
+    return condition
+
+
+def run_checks():
+    server, state = start_stub()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    results = []
+
+    # Keep-alive: sequential requests reuse one pooled connection
+    client = make_client("stub")
+    for i in range(5):
+        client.get_json(f"{base}/ok", {"i": i})
+    results.append(check(
+        f"5 sequential requests used {len(set(state.client_ports))} connection(s)",
+        len(set(state.client_ports)) == 1
+    ))
+
+    # Cache: an identical call is answered without a request
+    hits_before = state.hits["/ok"]
+    client.get_json(f"{base}/ok", {"i": 0})
+    results.append(check("Repeated call served from the cache", state.hits["/ok"] == hits_before))
+
+    # Retries: two 503s are retried transparently
+    state.flaky_failures = 2
+    body = client.get_json(f"{base}/flaky", {"q": "retry"})
+    results.append(check(
+        f"Flaky endpoint succeeded after {state.hits['/flaky']} attempts",
+        body["path"] == "/flaky" and state.hits["/flaky"] == 3
+    ))
+
+    # Circuit breaker: opens after repeated failures, then lets one trial through
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=0.5)
+    client = make_client("stub_down", retries=0, breaker=breaker)
+    for i in range(3):
+        try:
+            client.get_json(f"{base}/down", {"i": i})
+        except HttpStatusError:
+            pass
+    hits_before = state.hits["/down"]
+    try:
+        client.get_json(f"{base}/down", {"i": "rejected"})
+        rejected = False
+    except CircuitOpenError:
+        rejected = True
+    results.append(check(
+        "Circuit opened after 3 failures and refused the next call",
+        breaker.state == "open" and rejected and state.hits["/down"] == hits_before
+    ))
+
+    time.sleep(0.6)
+    try:
+        client.get_json(f"{base}/down", {"i": "trial"})
+    except HttpStatusError:
+        pass
+    results.append(check(
+        "Failed half-open trial reopened the circuit",
+        breaker.state == "open" and state.hits["/down"] == hits_before + 1
+    ))
+
+    time.sleep(0.6)
+    state.down = False
+    client.get_json(f"{base}/down", {"i": "recovered"})
+    results.append(check("Successful half-open trial closed the circuit", breaker.state == "closed"))
+
+    # Wolfram Alpha against the stub; the app id is not part of the cache key
+    client = make_client("wolfram_stub")
+    tool = WolframAlphaTool(app_id="stub-key", base_url=f"{base}/v2/query", client=client)
+    result = tool.execute("integrate x^2 from 0 to 5")
+    other_key = WolframAlphaTool(app_id="other-key", base_url=f"{base}/v2/query", client=client)
+    other_key.execute("integrate x^2 from 0 to 5")
+    results.append(check(
+        "Wolfram Alpha query parsed and reused across app ids",
+        result["success"] and result["results"][0]["result"] == "125/3" and state.hits["/v2/query"] == 1
+    ))
+
+    print(f"\n📊 Client stats: {client.stats()}")
+    server.shutdown()
+    return all(results)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run_checks() else 1)
@@ -0,0 +1,75 @@
+"""Import-time budget for the text input path.
+
+Builds UniversalMathInputProcessor and processes a plain-text problem in a
+fresh interpreter, then fails if any upload-only dependency was imported or
+the imports took longer than the budget.
+"""
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Only image, PDF and audio inputs may pull these in
+HEAVY_MODULES = ["pytesseract", "PIL", "PyPDF2", "pdf2image", "speech_recognition", "numpy"]
+
+PROBE = f"""
+import sys
+from src.input_processing import UniversalMathInputProcessor
+processor = UniversalMathInputProcessor()
+processor.process("Solve for x: 2x + 5 = 17")
+loaded = [name for name in {HEAVY_MODULES!r} if name in sys.modules]
+print(",".join(loaded))
+"""
+
+def parse_importtime(stderr):
+    """(cumulative microseconds, module) for each line of -X importtime output"""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        entries.append((int(cumulative), module.rstrip()))
+    return entries
+
+def run_check(budget_ms):
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True
+    )
+    if completed.returncode != 0:
+        print(completed.stderr)
+        return False
+
+    loaded = [name for name in completed.stdout.strip().split(",") if name]
+    entries = parse_importtime(completed.stderr)
+    # Top-level imports (no leading spaces) add up to the total import time
+    total_ms = sum(cumulative for cumulative, module in entries if not module.startswith("  ")) / 1000
+
+    print("🐢 Slowest imports:")
+    for cumulative, module in sorted(entries, reverse=True)[:10]:
+        print(f"   {cumulative / 1000:8.1f} ms  {module.strip()}")
+    print(f"\n📊 Text path import time: {total_ms:.1f} ms (budget {budget_ms:.0f} ms)")
+
+    ok = True
+    if loaded:
+        print(f"❌ Upload-only modules imported on the text path: {', '.join(loaded)}")
+        ok = False
+    if total_ms > budget_ms:
+        print("❌ Import time over budget")
+        ok = False
+    if ok:
+        print("✅ Within budget")
+    return ok
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "300")))
+
+    args = parser.parse_args()
+
+    sys.exit(0 if run_check(args.budget_ms) else 1)
@@ -0,0 +1,116 @@
+"""Microbenchmark: Normalizer vs. the old unguarded str.replace loops.
+
+Runs the Unicode, LaTeX and spoken-math tables over generated inputs of a
+few sizes, reports the time per call for both implementations and the
+batch API, and lists inputs where the outputs differ (the old loops
+replaced "to" inside words such as "tomato").
+
+Normalizer keeps one replace pass per key; a compiled single-pass regex
+(trie or plain alternation) measured slower than the loops on the tables
+that ship, so only the keys needing word boundaries go through re, and
+only when they occur in the text.
+"""
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.input_processing.normalizer import Normalizer, LATEX_COMMANDS, SPOKEN_MATH, UNICODE_SYMBOLS
+
+# Fragments the generated inputs are built from
+FRAGMENTS = {
+    "unicode": ["∫", "x²", "+", "3x", "dx", "×", "π", "÷", "√2", "∞", "∑", "y³", "∂f", "where", "n"],
+    "latex": ["\\int_0^1", "\\intop", "\\frac{a}{b}", "\\sum_{i=1}^n", "\\sqrt{x}", "\\partial", "\\prod", "x^2", "dx", "+", "\\infty"],
+    "speech": ["integral of", "x", "squared", "plus", "three", "from", "zero", "to", "five", "times",
+               "divided by", "minus", "cubed", "tomato", "total", "fromage"],
+}
+# Surrounding problem text; `--density` is the share of words drawn from FRAGMENTS
+PROSE = ["find", "the", "value", "of", "let", "be", "a", "function", "where", "and", "evaluate", "for", "all"]
+# Commands a fuller LaTeX table would add, to show how both approaches scale with table size
+EXTRA_COMMANDS = (
+    "alpha beta gamma delta epsilon zeta eta theta iota kappa lambda mu nu xi pi rho sigma tau "
+    "upsilon phi chi psi omega Gamma Delta Theta Lambda Xi Pi Sigma Phi Psi Omega sin cos tan sec "
+    "csc cot arcsin arccos arctan sinh cosh tanh log ln exp lim max min sup inf det cdot times div "
+    "pm mp leq geq neq approx infty"
+).split()
+TABLES = {"unicode": UNICODE_SYMBOLS, "latex": LATEX_COMMANDS, "speech": SPOKEN_MATH}
+
+
+def legacy_replace(table, text):
+    """The old implementation: one full scan per mapping"""
+    for key, value in table.items():
+        text = text.replace(key, value)
+    return text
+
+
+def make_input(fragments, words, rng, density):
+    return " ".join(rng.choice(fragments if rng.random() < density else PROSE) for _ in range(words))
+
+
+def bench(function, number):
+    return min(timeit.repeat(function, number=number, repeat=5)) / number
+
+
+def run(sizes, batch_size, density, seed):
+    rng = random.Random(seed)
+    normalizers = {
+        "unicode": Normalizer(UNICODE_SYMBOLS),
+        "latex": Normalizer(LATEX_COMMANDS, whole_words=True),
+        "speech": Normalizer(SPOKEN_MATH, whole_words=True),
+    }
+
+    print(f"{'table':<8} {'words':>6} {'legacy µs':>10} {'normalizer µs':>14} {'speedup':>8}")
+    for name, normalizer in normalizers.items():
+        table = TABLES[name]
+        for words in sizes:
+            text = make_input(FRAGMENTS[name], words, rng, density)
+            number = max(10, 20000 // words)
+            legacy = bench(lambda: legacy_replace(table, text), number)
+            current = bench(lambda: normalizer.normalize(text), number)
+            print(f"{name:<8} {words:>6} {legacy * 1e6:>10.1f} {current * 1e6:>14.1f} {legacy / current:>7.2f}x")
+
+    print("\n📈 LaTeX table size (1000 words)")
+    for extra in (0, len(EXTRA_COMMANDS) // 2, len(EXTRA_COMMANDS)):
+        table = dict(LATEX_COMMANDS, **{"\\" + command: command for command in EXTRA_COMMANDS[:extra]})
+        normalizer = Normalizer(table, whole_words=True)
+        fragments = FRAGMENTS["latex"] + ["\\" + command for command in EXTRA_COMMANDS[:extra]]
+        text = make_input(fragments, 1000, rng, density)
+        legacy = bench(lambda: legacy_replace(table, text), 20)
+        current = bench(lambda: normalizer.normalize(text), 20)
+        print(f"{len(table):>4} keys   legacy {legacy * 1e6:>8.1f} µs   normalizer {current * 1e6:>8.1f} µs   {legacy / current:>5.2f}x")
+
+    print(f"\n📦 Batch of {batch_size} short strings")
+    for name, normalizer in normalizers.items():
+        texts = [make_input(FRAGMENTS[name], 8, rng, density) for _ in range(batch_size)]
+        one_by_one = bench(lambda: [normalizer.normalize(text) for text in texts], 20)
+        batched = bench(lambda: normalizer.normalize_batch(texts), 20)
+        assert normalizer.normalize_batch(texts) == [normalizer.normalize(text) for text in texts]
+        print(f"{name:<8} per-string {one_by_one * 1e6:>9.1f} µs   batched {batched * 1e6:>9.1f} µs")
+
+    print("\n🔍 Output differences from the legacy loops")
+    for name, normalizer in normalizers.items():
+        differences = 0
+        for _ in range(200):
+            text = make_input(FRAGMENTS[name], 12, rng, density)
+            old, new = legacy_replace(TABLES[name], text), normalizer.normalize(text)
+            if old != new:
+                if differences < 3:
+                    print(f"   {name}: {text!r}\n      legacy:     {old!r}\n      normalizer: {new!r}")
+                differences += 1
+        print(f"   {name}: {differences}/200 inputs differ")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--density", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+
+    run(args.sizes, args.batch_size, args.density, args.seed)
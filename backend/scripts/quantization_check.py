@@ -0,0 +1,89 @@
+"""Accuracy spot-check of a quantized precision against the bf16 model"""
+import os
+import sys
+import time
+
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.transformer.model import MathTransformerModel
+from src.generation.generator import MathGenerator
+from src.generation.prompts import PromptTemplate
+from src.output.formatter import OutputFormatter
+
+SAMPLE_PROBLEMS = [
+    "Solve for x: 2x + 5 = 17",
+    "What is the derivative of x^3 + 2x^2 - 5x + 1?",
+    "Compute the integral of x^2 from 0 to 3.",
+    "A rectangle has a perimeter of 30 and a length of 9. What is its area?",
+    "Simplify (x^2 - 9) / (x - 3).",
+]
+
+def greedy(generator, problem, max_new_tokens):
+    """Greedy solution text and its token ids"""
+    messages = PromptTemplate.create_messages(problem, system_prompt="step_by_step")
+    start = time.perf_counter()
+    text = generator.generate(messages, max_new_tokens=max_new_tokens, do_sample=False)
+    elapsed = time.perf_counter() - start
+    return generator.extract_answer(text), generator.tokenizer(text)["input_ids"], elapsed
+
+def token_agreement(model, token_ids, prompt_len):
+    """Fraction of reference tokens the candidate also ranks first (teacher forcing)"""
+    inputs = torch.tensor([token_ids])
+    with torch.no_grad():
+        predictions = model(input_ids=inputs).logits[0, prompt_len - 1:-1].argmax(dim=-1)
+    reference = inputs[0, prompt_len:]
+    return (predictions == reference).float().mean().item() if len(reference) else 1.0
+
+def run_check(precision, lora_path, max_new_tokens, quantized_cache_dir):
+    reference = MathTransformerModel(lora_adapter_path=lora_path, device="cpu")
+    candidate = MathTransformerModel(
+        lora_adapter_path=lora_path,
+        device="cpu",
+        precision=precision,
+        quantized_cache_dir=quantized_cache_dir
+    )
+    ref_gen = MathGenerator(reference)
+    cand_gen = MathGenerator(candidate)
+    formatter = OutputFormatter()
+
+    matches, agreements = 0, []
+    ref_time, cand_time = 0.0, 0.0
+    for problem in SAMPLE_PROBLEMS:
+        ref_answer, ref_ids, ref_seconds = greedy(ref_gen, problem, max_new_tokens)
+        cand_answer, _, cand_seconds = greedy(cand_gen, problem, max_new_tokens)
+        ref_time += ref_seconds
+        cand_time += cand_seconds
+
+        prompt = candidate.tokenizer.apply_chat_template(
+            PromptTemplate.create_messages(problem, system_prompt="step_by_step"),
+            tokenize=False,
+            add_generation_prompt=True
+        )
+        agreement = token_agreement(candidate.get_model(), ref_ids, len(candidate.tokenizer(prompt)["input_ids"]))
+        agreements.append(agreement)
+
+        same = formatter.extract_final_answer(ref_answer) == formatter.extract_final_answer(cand_answer)
+        matches += same
+        print(f"{'✅' if same else '❌'} {problem}  (token agreement {agreement:.1%})")
+
+    print(f"\n📊 {precision} vs bf16")
+    print(f"   Final answers matching: {matches}/{len(SAMPLE_PROBLEMS)}")
+    print(f"   Mean token agreement:   {sum(agreements) / len(agreements):.1%}")
+    print(f"   Generation time:        {cand_time:.1f}s vs {ref_time:.1f}s ({ref_time / cand_time:.2f}x)")
+    return matches == len(SAMPLE_PROBLEMS)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--precision", choices=["int8", "int4"], default="int8")
+    parser.add_argument("--lora-path", default=os.getenv("LORA_ADAPTER_PATH", "./models/lora_adapter"))
+    parser.add_argument("--max-new-tokens", type=int, default=256)
+    parser.add_argument("--quantized-cache-dir", default=os.getenv("QUANTIZED_MODEL_DIR"))
+
+    args = parser.parse_args()
+
+    ok = run_check(args.precision, args.lora_path, args.max_new_tokens, args.quantized_cache_dir)
+    sys.exit(0 if ok else 1)
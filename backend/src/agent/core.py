@@ -1,16 +1,40 @@
-import json
-import re
+import asyncio
 import os
-from langchain.memory import ConversationBufferWindowMemory
-from src.input_processing.router import get_router_chain
+import queue
+import re
+import threading
+from concurrent.futures import Future
+from src.agent.sessions import SessionStore, DEFAULT_SESSION
+from src.input_processing.router import (
+    get_router_chain,
+    LocalRouter,
+    DecisionCache,
+    parse_router_output,
+)
 from src.generation.inference import MathSolverInference
-from src.output.formatter import clean_latex
+from src.generation.scheduler import GenerationCancelled
+from src.output.formatter import clean_latex, LatexStreamCleaner
+
+def same_problem(first, second):
+    """Whether two problem statements differ only in spacing, case or end punctuation"""
+    normalize = lambda text: re.sub(r"\s+", "", text).lower().rstrip(".?!")
+    return normalize(first) == normalize(second)
+
 
 class MathAgent:
-    def __init__(self, enable_tools=True, enable_wolfram=True, wolfram_api_key=os.getenv('WOLFRAM_API_KEY')):
-        # We use return_messages=False so we get a string history, not objects
-        self.memory = ConversationBufferWindowMemory(k=3, return_messages=False)
+    def __init__(self, enable_tools=True, enable_wolfram=True, wolfram_api_key=os.getenv('WOLFRAM_API_KEY'), sessions=None, speculative_routing=None):
+        # Per-user history; the model and tools below are shared by every session
+        self.sessions = sessions or SessionStore()
         self.router = get_router_chain()
+        # Obvious inputs and repeated follow-ups skip the remote router
+        self.local_router = LocalRouter()
+        self.decision_cache = DecisionCache()
+        self.remote_routes = 0
+        # Start solving the raw input while the remote router is still deciding
+        if speculative_routing is None:
+            speculative_routing = os.getenv('SPECULATIVE_ROUTING', 'true').lower() == 'true'
+        self.speculative_routing = speculative_routing
+        self.speculation = {"started": 0, "kept": 0, "wasted": 0}
         if wolfram_api_key is None:
             wolfram_api_key = os.getenv('WOLFRAM_API_KEY')
         self.worker = MathSolverInference(
@@ -21,55 +45,247 @@ class MathAgent:
         self.enable_tools = enable_tools 
         self.enable_wolfram = enable_wolfram
 
-    def run(self, user_input, max_tokens=2048, use_tools=None):
+    @property
+    def memory(self):
+        """Memory of the default session"""
+        return self.sessions.get(DEFAULT_SESSION).memory
+
+    def reset(self, session_id=None):
+        """Forget one session's history; the model stays loaded"""
+        return self.sessions.reset(session_id)
+
+    def run(self, user_input, max_tokens=2048, use_tools=None, session_id=None, adapter=None, temperature=0.7, allow_cached=None):
         print(f"🧠 Agent processing: {user_input}")
         
       
-        history = self.memory.load_memory_variables({})['history']
+        history = self.sessions.get(session_id).history()
         
         # 2. Manager Decides (Router)
-        decision_raw = self.router.run(history=history, input=user_input)
+        decision = self.quick_route(history, user_input)
+        if decision is None and self.speculative_routing:
+            # Solve the raw input on a thread while the remote router decides
+            cancel = threading.Event()
+            speculation = _run_in_thread(
+                self._speculative_solve,
+                {"type": "math", "content": user_input},
+                max_tokens=max_tokens, use_tools=use_tools, adapter=adapter, cancel=cancel,
+                temperature=temperature, allow_cached=allow_cached
+            )
+            try:
+                decision = self.remote_route(history, user_input)
+            except Exception:
+                cancel.set()
+                raise
+            if self._keep_speculation(decision, user_input, cancel):
+                return self.respond(user_input, decision, speculation.result(), session_id=session_id)
+        elif decision is None:
+            decision = self.remote_route(history, user_input)
 
-        try:
-            # 1. Clean Markdown wrappers
-            clean_json = decision_raw.strip()
-            if clean_json.startswith("```json"):
-                clean_json = clean_json[7:]
-            if clean_json.endswith("```"):
-                clean_json = clean_json[:-3]
-            clean_json = clean_json.strip()
+        # 3. Execution Logic
+        result_dict = None
+        if decision.get('type') != 'chat':
+            result_dict = self.solve(
+                decision, max_tokens=max_tokens, use_tools=use_tools, adapter=adapter,
+                temperature=temperature, allow_cached=allow_cached
+            )
 
-            clean_json = re.sub(r'(?<!\\)\\(?![u"\\/bfnrt])', r'\\\\', clean_json)
+        return self.respond(user_input, decision, result_dict, session_id=session_id)
 
-            decision = json.loads(clean_json)
+    async def run_async(self, user_input, executor, max_tokens=2048, use_tools=None, session_id=None, adapter=None, temperature=0.7, allow_cached=None):
+        """Like run(), but each blocking stage runs on the executor's pools"""
+        print(f"🧠 Agent processing: {user_input}")
+        history = self.sessions.get(session_id).history()
+
+        decision = self.quick_route(history, user_input)
+        if decision is None and self.speculative_routing:
+            cancel = threading.Event()
+            speculation = executor.submit_inference(
+                self._speculative_solve,
+                {"type": "math", "content": user_input},
+                max_tokens=max_tokens, use_tools=use_tools, adapter=adapter, cancel=cancel,
+                temperature=temperature, allow_cached=allow_cached
+            )
+            try:
+                decision = await executor.run_io(self.remote_route, history, user_input)
+            except Exception:
+                cancel.set()
+                raise
+            if self._keep_speculation(decision, user_input, cancel):
+                result_dict = await asyncio.wrap_future(speculation)
+                return self.respond(user_input, decision, result_dict, session_id=session_id)
+        elif decision is None:
+            decision = await executor.run_io(self.remote_route, history, user_input)
+
+        result_dict = None
+        if decision.get('type') != 'chat':
+            result_dict = await executor.run_inference(
+                self.solve, decision, max_tokens=max_tokens, use_tools=use_tools, adapter=adapter,
+                temperature=temperature, allow_cached=allow_cached
+            )
 
-        except Exception as e:
-            print(f"⚠️ JSON Parse Error: {e}. Raw: {decision_raw}")
-         
-            decision = {"type": "math", "content": user_input}
+        return self.respond(user_input, decision, result_dict, session_id=session_id)
 
-        response = ""
+    def run_stream(self, user_input, max_tokens=2048, use_tools=None, executor=None, session_id=None, adapter=None, temperature=0.7, allow_cached=None):
+        """Like run(), but yields events while the answer is being produced"""
+        print(f"🧠 Agent streaming: {user_input}")
+        history = self.sessions.get(session_id).history()
         
-        # 3. Execution Logic
+        if executor is not None:
+            decision = executor.submit_io(self.route, history, user_input).result()
+        else:
+            decision = self.route(history, user_input)
+        yield {"type": "router", "decision": decision}
+
+        result_dict = None
+        if decision.get('type') != 'chat':
+            # Generation runs on its own thread; its events are relayed from a queue
+            events = queue.Queue()
+            outcome = {}
+
+            def work():
+                try:
+                    outcome['result'] = self.solve(
+                        decision,
+                        max_tokens=max_tokens,
+                        use_tools=use_tools,
+                        on_event=events.put,
+                        adapter=adapter,
+                        temperature=temperature,
+                        allow_cached=allow_cached
+                    )
+                except Exception as e:
+                    outcome['error'] = e
+                finally:
+                    events.put(None)
+
+            if executor is not None:
+                executor.submit_inference(work)
+            else:
+                threading.Thread(target=work, daemon=True).start()
+            cleaner = LatexStreamCleaner()
+            while True:
+                event = events.get()
+                if event is None:
+                    break
+                if event['type'] == 'token':
+                    text = cleaner.feed(event['text'])
+                    if text:
+                        yield {"type": "token", "text": text}
+                else:
+                    # Tool events break the text stream, so release anything held back
+                    tail = cleaner.flush()
+                    if tail:
+                        yield {"type": "token", "text": tail}
+                    yield event
+            tail = cleaner.flush()
+            if tail:
+                yield {"type": "token", "text": tail}
+
+            if 'error' in outcome:
+                raise outcome['error']
+            result_dict = outcome['result']
+
+        response = self.respond(user_input, decision, result_dict, session_id=session_id)
+        yield {"type": "final", "response": response}
+
+    def route(self, history, user_input):
+        """Decide whether this is chat or math, and find the standalone problem.
+
+        Greetings and self-contained math are routed locally; only inputs
+        that may depend on earlier turns go to the remote router.
+        """
+        decision = self.quick_route(history, user_input)
+        if decision is not None:
+            return decision
+        return self.remote_route(history, user_input)
+
+    def quick_route(self, history, user_input):
+        """Route without a network call, or return None"""
+        decision = self.local_router.classify(history, user_input)
+        if decision is not None:
+            print(f"⚡ Routed locally: {decision['type']}")
+            return decision
+        return self.decision_cache.get(history, user_input)
+
+    def remote_route(self, history, user_input):
+        """Ask the remote router, caching usable decisions"""
+        self.remote_routes += 1
+        decision_raw = self.router.run(history=history, input=user_input)
+        decision = parse_router_output(decision_raw)
+        if decision is None:
+            return {"type": "math", "content": user_input}
+
+        self.decision_cache.put(history, user_input, decision)
+        return decision
+
+    def router_stats(self):
+        """How inputs were routed: locally, from the decision cache or remotely"""
+        return {
+            "local": self.local_router.decisions,
+            "cache": self.decision_cache.stats(),
+            "remote": self.remote_routes,
+            "speculation": dict(self.speculation),
+        }
+
+    def _speculative_solve(self, decision, cancel, **kwargs):
+        """solve() that returns None instead of raising when it is cancelled"""
+        try:
+            return self.solve(decision, cancel=cancel, **kwargs)
+        except GenerationCancelled:
+            return None
+
+    def _keep_speculation(self, decision, user_input, cancel):
+        """Keep a speculative solve of the raw input if the router agrees with it"""
+        self.speculation["started"] += 1
+        if decision.get('type') == 'math' and same_problem(decision.get('content', ''), user_input):
+            self.speculation["kept"] += 1
+            return True
+        # The router rewrote or rerouted the input; the raw-input solve is wasted
+        cancel.set()
+        self.speculation["wasted"] += 1
+        print("↩️  Router rewrote the input, restarting the solve")
+        return False
+
+    def solve(self, decision, max_tokens=2048, use_tools=None, on_event=None, adapter=None, cancel=None, temperature=0.7, allow_cached=None):
+        """Run the math worker on a routed problem"""
+        print(f"🧮 Routing to: Math Worker -> {decision.get('content')}")
+        # Use the REFINED content (which has the full context)
+        return self.worker.solve(
+            decision['content'],
+            system_prompt="with_tools" if use_tools else "step_by_step",  
+            max_tokens=max_tokens,
+            temperature=temperature,
+            use_tools=use_tools,
+            on_event=on_event,
+            adapter=adapter,
+            cancel=cancel,
+            allow_cached=allow_cached
+        )
+
+    def respond(self, user_input, decision, result_dict=None, session_id=None):
+        """Build the final reply for a routed input and save the turn to memory"""
         if decision.get('type') == 'chat':
             print("💬 Routing to: General Chat")
             response = decision.get('content', "Hello!")
         else:
-            print(f"🧮 Routing to: Math Worker -> {decision.get('content')}")
-            
-            # Use the REFINED content (which has the full context)
-            result_dict = self.worker.solve(
-                decision['content'],
-                system_prompt="with_tools" if use_tools else "step_by_step",  
-                max_tokens=max_tokens,
-                use_tools=use_tools
-            )
-            raw_math = result_dict['solution'] 
-            
             # Clean up the LaTeX delimiters ($$) for the frontend
-            response = clean_latex(raw_math)
+            response = clean_latex(result_dict['solution'])
 
         # 4. Save to Memory
-        self.memory.save_context({"input": user_input}, {"output": response})
+        self.sessions.save_turn(session_id, user_input, response)
         
-        return response
\ No newline at end of file
+        return response
+
+
+def _run_in_thread(fn, *args, **kwargs):
+    """Run fn on a daemon thread and return a Future for its result"""
+    future = Future()
+
+    def work():
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=work, daemon=True).start()
+    return future
\ No newline at end of file
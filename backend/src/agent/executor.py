@@ -0,0 +1,94 @@
+"""Bounded thread pools that keep blocking agent work off the event loop"""
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+
+class _TrackedPool:
+    """ThreadPoolExecutor that counts queued, running and finished jobs"""
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_wait = 0.0
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        submitted_at = time.perf_counter()
+        with self._lock:
+            self.queued += 1
+
+        def job():
+            with self._lock:
+                self.queued -= 1
+                self.running += 1
+                self.total_wait += time.perf_counter() - submitted_at
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException:
+                with self._lock:
+                    self.running -= 1
+                    self.failed += 1
+                raise
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+            return result
+
+        return self._pool.submit(job)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            started = self.completed + self.failed  # Every started job contributed its wait
+            return {
+                "workers": self.max_workers,
+                "queued": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "avg_wait_seconds": round(self.total_wait / started, 4) if started else 0.0,
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class AgentExecutor:
+    """Runs agent stages on dedicated pools.
+
+    Inference (torch generation and tool execution) gets a fixed number of
+    slots; I/O-bound stages such as the remote router get their own pool so
+    they never wait behind a long generation.
+    """
+
+    def __init__(self, inference_slots: int = 4, io_workers: int = 8):
+        self.inference = _TrackedPool("inference", inference_slots)
+        self.io = _TrackedPool("agent-io", io_workers)
+
+    def submit_inference(self, fn: Callable, *args, **kwargs) -> Future:
+        return self.inference.submit(fn, *args, **kwargs)
+
+    def submit_io(self, fn: Callable, *args, **kwargs) -> Future:
+        return self.io.submit(fn, *args, **kwargs)
+
+    async def run_inference(self, fn: Callable, *args, **kwargs):
+        """Await a blocking inference call without blocking the event loop"""
+        return await asyncio.wrap_future(self.submit_inference(fn, *args, **kwargs))
+
+    async def run_io(self, fn: Callable, *args, **kwargs):
+        """Await a blocking I/O-bound call without blocking the event loop"""
+        return await asyncio.wrap_future(self.submit_io(fn, *args, **kwargs))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"inference": self.inference.stats(), "io": self.io.stats()}
+
+    def shutdown(self):
+        self.inference.shutdown()
+        self.io.shutdown()
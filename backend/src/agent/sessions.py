@@ -0,0 +1,119 @@
+"""Per-session conversation memory with LRU/TTL eviction"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+from langchain.memory import ConversationBufferWindowMemory
+
+DEFAULT_SESSION = "default"
+
+
+class Session:
+    """Conversation state of a single user"""
+
+    def __init__(self, session_id: str, window: int = 3):
+        self.session_id = session_id
+        # We use return_messages=False so we get a string history, not objects
+        self.memory = ConversationBufferWindowMemory(k=window, return_messages=False)
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.size = 0  # Approximate characters held in memory
+
+    def history(self) -> str:
+        return self.memory.load_memory_variables({})['history']
+
+    def trim(self):
+        """Drop turns older than the window; the memory itself keeps them all"""
+        messages = self.memory.chat_memory.messages
+        del messages[:max(0, len(messages) - 2 * self.memory.k)]  # One user + one AI message per turn
+        self.size = sum(len(message.content) for message in messages)
+
+
+class SessionStore:
+    """Holds per-session memories next to one shared model.
+
+    Sessions are evicted least-recently-used first when there are too many,
+    when they have been idle longer than `ttl_seconds`, or when the total
+    history size exceeds `max_total_chars`.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 1000,
+        ttl_seconds: float = 3600,
+        max_total_chars: int = 50_000_000,
+        window: int = 3
+    ):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_total_chars = max_total_chars
+        self.window = window
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_chars = 0
+        self.evictions = 0
+
+    def get(self, session_id: Optional[str] = None) -> Session:
+        """Return the session, creating it if needed, and mark it as recently used"""
+        session_id = session_id or DEFAULT_SESSION
+        with self._lock:
+            self._evict_expired()
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = Session(session_id, window=self.window)
+                self._sessions[session_id] = session
+                self._evict_over_capacity()
+            else:
+                self._sessions.move_to_end(session_id)
+            session.last_used = time.time()
+            return session
+
+    def save_turn(self, session_id: Optional[str], user_input: str, response: str):
+        """Append a turn to a session's memory and update the size accounting"""
+        session = self.get(session_id)
+        session.memory.save_context({"input": user_input}, {"output": response})
+        with self._lock:
+            old_size = session.size
+            session.trim()
+            # An evicted session's size was already subtracted; don't count it again
+            if self._sessions.get(session.session_id) is session:
+                self.total_chars += session.size - old_size
+                self._evict_over_capacity()
+
+    def reset(self, session_id: Optional[str] = None) -> bool:
+        """Forget a single session; returns False if it did not exist"""
+        with self._lock:
+            session = self._sessions.pop(session_id or DEFAULT_SESSION, None)
+            if session is None:
+                return False
+            self.total_chars -= session.size
+            return True
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "total_chars": self.total_chars,
+                "evictions": self.evictions,
+            }
+
+    def _evict_expired(self):
+        cutoff = time.time() - self.ttl_seconds
+        # The dict is in LRU order, so expired sessions are at the front
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if oldest.last_used >= cutoff:
+                break
+            self._drop_oldest()
+
+    def _evict_over_capacity(self):
+        while len(self._sessions) > 1 and (
+            len(self._sessions) > self.max_sessions
+            or self.total_chars > self.max_total_chars
+        ):
+            self._drop_oldest()
+
+    def _drop_oldest(self):
+        _, session = self._sessions.popitem(last=False)
+        self.total_chars -= session.size
+        self.evictions += 1
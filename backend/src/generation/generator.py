@@ -1,97 +1,481 @@
 """Text generation with tool calling support"""
+import threading
+import time
 import torch
-from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Dict, Optional
+from transformers import StoppingCriteria, StoppingCriteriaList, StopStringCriteria
 from src.tools.tool_router import ToolRouter
+from src.generation.kv_cache import slice_positions, seq_length
+from src.generation.scheduler import GenerationCancelled
+
+
+class GenerationSession:
+    """A single token sequence grown across successive generation calls"""
+    
+    def __init__(self):
+        self.token_ids: List[int] = []  # Prompt + generated tokens so far
+        self.cache = None               # KV cache for a prefix of `token_ids`
+        self.prefilled_tokens = 0
+        self.reused_tokens = 0
+    
+    def reusable_prefix(self, input_ids: List[int]) -> int:
+        """Length of the cached prefix shared with a new prompt"""
+        if self.cache is None:
+            return 0
+        shared = 0
+        for cached, new in zip(self.token_ids[:seq_length(self.cache)], input_ids):
+            if cached != new:
+                break
+            shared += 1
+        # At least one token must be prefilled to get next-token logits
+        return min(shared, len(input_ids) - 1)
+    
+    def stats(self) -> Dict:
+        return {
+            "prefilled_tokens": self.prefilled_tokens,
+            "reused_tokens": self.reused_tokens
+        }
+
+
+class TokenStreamer:
+    """Turns a stream of token ids into text deltas"""
+    
+    def __init__(self, tokenizer, on_text: Callable[[str], None]):
+        self.tokenizer = tokenizer
+        self.on_text = on_text
+        self.token_ids: List[int] = []
+        self.emitted = 0
+    
+    def put(self, token_id: int):
+        self.token_ids.append(token_id)
+        text = self.tokenizer.decode(self.token_ids, skip_special_tokens=True)
+        if text.endswith("\ufffd"):
+            return  # Incomplete multi-byte character, wait for the next token
+        delta = text[self.emitted:]
+        self.emitted = len(text)
+        if delta:
+            self.on_text(delta)
+        if text.endswith("\n"):
+            # Start a fresh window so decoding cost does not grow with the answer
+            self.token_ids, self.emitted = [], 0
+    
+    def reset(self):
+        """Forget the current window (e.g. before text is injected)"""
+        self.token_ids, self.emitted = [], 0
+
+
+class _CallbackStreamer:
+    """Adapts an on_token callback to the model.generate streamer interface"""
+    
+    def __init__(self, on_token: Callable[[int], None]):
+        self.on_token = on_token
+        self.prompt_seen = False
+    
+    def put(self, value):
+        if not self.prompt_seen:
+            self.prompt_seen = True  # generate() first echoes the prompt
+            return
+        for token_id in value.reshape(-1).tolist():
+            self.on_token(token_id)
+    
+    def end(self):
+        pass
+
+
+class _CancelCriteria(StoppingCriteria):
+    """Stops model.generate once a cancel event is set"""
+    
+    def __init__(self, cancel: threading.Event):
+        self.cancel = cancel
+    
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), self.cancel.is_set(), dtype=torch.bool, device=input_ids.device)
+
+
+class _StopStringPositions(StoppingCriteria):
+    """Stop-string criterion that remembers where each row stopped.
+    
+    After a row stops, generate() pads it to the batch length; with the pad
+    token equal to EOS that padding cannot be told apart from a real EOS.
+    """
+    
+    def __init__(self, tokenizer, stop_strings: List[str]):
+        self.criteria = StopStringCriteria(tokenizer, stop_strings)
+        self.stopped_at: Dict[int, int] = {}  # Row -> sequence length when it stopped
+    
+    def __call__(self, input_ids, scores, **kwargs):
+        stopped = self.criteria(input_ids, scores, **kwargs)
+        for row in torch.nonzero(stopped).flatten().tolist():
+            self.stopped_at.setdefault(row, input_ids.shape[-1])
+        return stopped
+
+
+def length_buckets(lengths: List[int], max_batch_size: int, max_padding: float = 0.25) -> List[List[int]]:
+    """Group indices of similar length into batches.
+    
+    Within a bucket the shortest prompt is left-padded by at most
+    `max_padding` of the longest one.
+    """
+    order = sorted(range(len(lengths)), key=lambda index: lengths[index])
+    buckets, current = [], []
+    for index in order:
+        if current and (
+            len(current) >= max_batch_size
+            or lengths[index] - lengths[current[0]] > max_padding * lengths[index]
+        ):
+            buckets.append(current)
+            current = []
+        current.append(index)
+    if current:
+        buckets.append(current)
+    return buckets
+
 
 class MathGenerator:
     """Handles text generation with tool calling"""
     
-    def __init__(self, model_wrapper):
+    def __init__(self, model_wrapper, scheduler=None, drafter=None):
         self.model_wrapper = model_wrapper
         self.model = model_wrapper.get_model()
         self.tokenizer = model_wrapper.get_tokenizer()
         self.device = model_wrapper.device
         self.tool_router = ToolRouter()
         self.max_tool_iterations = 5  # Prevent infinite loops
+        self.max_tool_calls_per_turn = 4
+        self.tool_call_lookahead = 6  # Most tokens decoded before giving up on another call
+        self.max_prompt_tokens = 2048
+        self.max_batch_size = 8  # Rows per model.generate call in generate_batch (no scheduler)
+        # Optional GenerationScheduler; when set, requests share one decode loop
+        self.scheduler = scheduler
+        # Optional drafter (see speculative.py); enables speculative decoding by default
+        self.drafter = drafter
+        self.speculative = drafter is not None
     
     def generate_with_tools(
         self,
         messages: List[Dict],
         max_new_tokens: int = 512,
         temperature: float = 0.7,
+        on_event: Optional[Callable[[Dict], None]] = None,
         **kwargs
     ) -> Dict:
-        """Generate with iterative tool calling"""
+        """Generate with iterative tool calling.
+        
+        Decoding stops as soon as a tool call is closed; the tool result is
+        appended to the same sequence and decoding resumes from there.
+        `on_event` receives token deltas and tool_call_start/end events.
+        """
         
         conversation_history = messages.copy()
+        session = GenerationSession()
+        stop_strings = [self.tool_router.tool_call_end]
+        streamer = None
+        if on_event is not None:
+            streamer = TokenStreamer(
+                self.tokenizer,
+                lambda text: on_event({"type": "token", "text": text})
+            )
+            kwargs["on_token"] = streamer.put
+        
+        raw_output = self.generate(
+            conversation_history,
+            max_new_tokens=max_new_tokens,
+            temperature=temperature,
+            session=session,
+            stop_strings=stop_strings,
+            **kwargs
+        )
+        segment = self.extract_answer(raw_output)
+        answer, tool_calls_made, iteration, segment = self._tool_loop(
+            session,
+            segment,
+            on_event=on_event,
+            streamer=streamer,
+            max_new_tokens=max_new_tokens,
+            temperature=temperature,
+            stop_strings=stop_strings,
+            **kwargs
+        )
+        
+        conversation_history.append({"role": "assistant", "content": answer})
+        
+        result = {
+            "final_answer": answer,
+            "tool_calls": tool_calls_made,
+            "iterations": iteration,
+            "prefill": session.stats(),
+            "conversation": conversation_history
+        }
+        if iteration >= self.max_tool_iterations and self.tool_router.detect_tool_call(segment):
+            result["warning"] = "Max tool iterations reached"
+        return result
+    
+    def _tool_loop(
+        self,
+        session: GenerationSession,
+        segment: str,
+        max_new_tokens: int,
+        temperature: float,
+        stop_strings: List[str],
+        on_event: Optional[Callable[[Dict], None]] = None,
+        streamer: Optional[TokenStreamer] = None,
+        **kwargs
+    ):
+        """Run the tools called in `segment` and keep decoding until no call is left.
+        
+        Returns (answer, tool calls made, iterations, last segment).
+        """
+        answer = ""
         tool_calls_made = []
         iteration = 0
         
-        while iteration < self.max_tool_iterations:
-            # Generate response
-            raw_output = self.generate(
-                conversation_history,
-                max_new_tokens=max_new_tokens,
-                temperature=temperature,
-                **kwargs
-            )
+        while self.tool_router.detect_tool_call(segment):
+            tool_calls = self.tool_router.parse_tool_calls(segment)
+            if not tool_calls or iteration >= self.max_tool_iterations:
+                break
+            if kwargs.get("cancel") is not None and kwargs["cancel"].is_set():
+                raise GenerationCancelled()
             
-            answer = self.extract_answer(raw_output)
+            # Start each tool as soon as its call is closed; while they run, let
+            # the model add further calls that do not need their results
+            futures = []
+            while True:
+                for tool_call in tool_calls[len(futures):]:
+                    if on_event is not None:
+                        on_event({
+                            "type": "tool_call_start",
+                            "tool": tool_call["tool_name"],
+                            "params": tool_call["params"]
+                        })
+                    futures.append(self.tool_router.submit_tool(tool_call))
+                if len(tool_calls) >= self.max_tool_calls_per_turn:
+                    break
+                next_call = self._next_tool_call(
+                    session,
+                    max_new_tokens=max_new_tokens,
+                    temperature=temperature,
+                    stop_strings=stop_strings,
+                    **kwargs
+                )
+                if next_call is None:
+                    break
+                segment += "\n" + next_call
+                parsed = self.tool_router.parse_tool_calls(next_call)
+                if not parsed:
+                    break
+                tool_calls += parsed
             
-            # Check for tool calls
-            if self.tool_router.detect_tool_call(answer):
-                # Parse tool call
-                tool_call = self.tool_router.parse_tool_call(answer)
-                
-                if tool_call:
-                    # Execute tool
-                    result = self.tool_router.execute_tool(tool_call)
-                    tool_calls_made.append({
+            results = [future.result() for future in futures]
+            for tool_call, result in zip(tool_calls, results):
+                if on_event is not None:
+                    on_event({
+                        "type": "tool_call_end",
                         "tool": tool_call["tool_name"],
-                        "params": tool_call["params"],
-                        "result": result
+                        "success": result["success"],
+                        "result": self.tool_router.format_result(result),
+                        "seconds": result["seconds"]
                     })
-                    
-                    # Inject result back
-                    answer_with_result = self.tool_router.inject_result(answer, result)
-                    
-                    # Add to conversation
-                    conversation_history.append({
-                        "role": "assistant",
-                        "content": answer_with_result
-                    })
-                    
-                    iteration += 1
-                    continue
+                tool_calls_made.append({
+                    "tool": tool_call["tool_name"],
+                    "params": tool_call["params"],
+                    "result": result
+                })
+            if streamer is not None:
+                streamer.reset()
             
-            # No more tool calls, we're done
-            return {
+            # Show the results in place of the calls, but keep the calls in the sequence
+            answer += self.tool_router.inject_results(segment, tool_calls, results) + "\n"
+            formatted = "\n".join(self.tool_router.format_result(result) for result in results)
+            segment = self.continue_generation(
+                session,
+                "\n" + formatted + "\n",
+                max_new_tokens=max_new_tokens,
+                temperature=temperature,
+                stop_strings=stop_strings,
+                **kwargs
+            )
+            iteration += 1
+        
+        answer += segment
+        return answer, tool_calls_made, iteration, segment
+    
+    def generate_batch(
+        self,
+        messages_batch: List[List[Dict]],
+        max_new_tokens: int = 512,
+        temperature: float = 0.7,
+        use_tools: bool = True,
+        **kwargs
+    ) -> List[Dict]:
+        """Generate answers for several conversations together.
+        
+        All prompts are tokenized in one call and decoded in shared batches
+        (length-bucketed when there is no scheduler). Sequences that stop on
+        a tool call then continue on their own threads, so the others return
+        without waiting for tools. Each result has `seconds` until it finished.
+        """
+        started = time.perf_counter()
+        prompts = [
+            self.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+            for messages in messages_batch
+        ]
+        input_ids_batch = [ids[-self.max_prompt_tokens:] for ids in self.tokenizer(prompts)["input_ids"]]
+        sessions = [GenerationSession() for _ in messages_batch]
+        stop_strings = [self.tool_router.tool_call_end] if use_tools else None
+        
+        finished_at = self._generate_batch_ids(
+            input_ids_batch,
+            sessions,
+            max_new_tokens=max_new_tokens,
+            temperature=temperature,
+            stop_strings=stop_strings,
+            **kwargs
+        )
+        segments = [
+            self.extract_answer(self.tokenizer.decode(session.token_ids, skip_special_tokens=False))
+            for session in sessions
+        ]
+        results: List[Optional[Dict]] = [None] * len(sessions)
+        
+        def finish(index: int, answer: str, tool_calls: List[Dict], iterations: int, done: float):
+            results[index] = {
                 "final_answer": answer,
-                "tool_calls": tool_calls_made,
-                "iterations": iteration,
-                "conversation": conversation_history
+                "tool_calls": tool_calls,
+                "iterations": iterations,
+                "prefill": sessions[index].stats(),
+                "seconds": round(done - started, 3)
             }
         
-        # Max iterations reached
-        return {
-            "final_answer": answer,
-            "tool_calls": tool_calls_made,
-            "iterations": iteration,
-            "warning": "Max tool iterations reached",
-            "conversation": conversation_history
-        }
+        def run_tools(index: int):
+            answer, tool_calls, iterations, _ = self._tool_loop(
+                sessions[index],
+                segments[index],
+                max_new_tokens=max_new_tokens,
+                temperature=temperature,
+                stop_strings=stop_strings,
+                **kwargs
+            )
+            finish(index, answer, tool_calls, iterations, time.perf_counter())
+        
+        with_tools = [
+            index for index, segment in enumerate(segments)
+            if use_tools and self.tool_router.detect_tool_call(segment)
+        ]
+        for index, segment in enumerate(segments):
+            if index not in with_tools:
+                finish(index, segment, [], 0, finished_at[index])
+        if with_tools:
+            # Tool loops block on tools; their decode steps still batch on the scheduler
+            workers = min(len(with_tools), self.max_batch_size)
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch-tools") as pool:
+                list(pool.map(run_tools, with_tools))
+        return results
+    
+    def _generate_batch_ids(
+        self,
+        input_ids_batch: List[List[int]],
+        sessions: List[GenerationSession],
+        stop_strings: Optional[List[str]] = None,
+        adapter: Optional[str] = None,
+        **sampling
+    ) -> List[float]:
+        """Decode every prompt into its session; returns each row's finish time"""
+        finished_at = [0.0] * len(input_ids_batch)
+        lengths = [len(ids) for ids in input_ids_batch]
+        
+        if self.scheduler is not None:
+            # Shortest first, so rows admitted together need little left padding
+            requests = {}
+            for index in sorted(range(len(lengths)), key=lambda index: lengths[index]):
+                request = self.scheduler.submit(
+                    input_ids_batch[index],
+                    return_cache=True,
+                    stop_strings=stop_strings,
+                    adapter=adapter,
+                    **sampling
+                )
+                request.future.add_done_callback(
+                    lambda _, index=index: finished_at.__setitem__(index, time.perf_counter())
+                )
+                requests[index] = request
+            for index, request in requests.items():
+                result = request.result()
+                session = sessions[index]
+                session.token_ids = input_ids_batch[index] + result["token_ids"]
+                session.cache = result["cache"]
+                session.prefilled_tokens += lengths[index]
+            return finished_at
+        
+        adapter = self.model_wrapper.resolve_adapter(adapter)
+        if not sampling.get("do_sample", True) or sampling.get("temperature", 1.0) <= 0:
+            sampling.update(do_sample=False, temperature=None)
+        eos_token_id = self.model_wrapper.get_eos_token_id()
+        pad_token_id = self.tokenizer.pad_token_id
+        if pad_token_id is None:
+            pad_token_id = eos_token_id
+        
+        for bucket in length_buckets(lengths, self.max_batch_size):
+            width = max(lengths[index] for index in bucket)
+            inputs = torch.tensor(
+                [[pad_token_id] * (width - lengths[index]) + input_ids_batch[index] for index in bucket],
+                device=self.device
+            )
+            attention_mask = torch.tensor(
+                [[0] * (width - lengths[index]) + [1] * lengths[index] for index in bucket],
+                device=self.device
+            )
+            stop_positions = _StopStringPositions(self.tokenizer, stop_strings) if stop_strings else None
+            with self.model_wrapper.lock, torch.no_grad():
+                outputs = self.model_wrapper.get_model().generate(
+                    input_ids=inputs,
+                    attention_mask=attention_mask,
+                    stopping_criteria=StoppingCriteriaList([stop_positions] if stop_positions else []),
+                    eos_token_id=eos_token_id,
+                    pad_token_id=pad_token_id,
+                    **self.model_wrapper.adapter_kwargs([adapter] * len(bucket)),
+                    **sampling
+                )
+            done = time.perf_counter()
+            for row, index in enumerate(bucket):
+                generated = outputs[row, width:].tolist()
+                if stop_positions and row in stop_positions.stopped_at:
+                    # Ends on the stop string; what follows is padding, not EOS
+                    generated = generated[:stop_positions.stopped_at[row] - width]
+                elif eos_token_id in generated:
+                    generated = generated[:generated.index(eos_token_id) + 1]
+                while generated and generated[-1] == pad_token_id and pad_token_id != eos_token_id:
+                    generated.pop()  # Rows that stopped early are padded to the batch length
+                session = sessions[index]
+                session.token_ids = input_ids_batch[index] + generated
+                session.prefilled_tokens += lengths[index]
+                finished_at[index] = done
+        return finished_at
     
     def generate(
-        self, 
+        self,
         messages: List[Dict],
         max_new_tokens: int = 512,
         temperature: float = 0.7,
         top_p: float = 0.9,
         top_k: int = 50,
         do_sample: bool = True,
-        repetition_penalty: float = 1.1
+        repetition_penalty: float = 1.1,
+        session: Optional[GenerationSession] = None,
+        stop_strings: Optional[List[str]] = None,
+        on_token: Optional[Callable[[int], None]] = None,
+        adapter: Optional[str] = None,
+        speculative: Optional[bool] = None,
+        cancel: Optional[threading.Event] = None
     ) -> str:
-        """Generate response from messages"""
+        """Generate response from messages.
+        
+        With a `session`, the cached prefix shared with the previous call is
+        reused (scheduler only) and the sequence can later be continued.
+        `speculative` drafts tokens from the prompt and verifies them in one
+        forward pass; it defaults to on when the generator has a drafter.
+        Setting `cancel` abandons the generation with GenerationCancelled.
+        """
         
         # Format prompt using chat template
         formatted_prompt = self.tokenizer.apply_chat_template(
@@ -100,41 +484,177 @@ class MathGenerator:
             add_generation_prompt=True
         )
         
-        # Tokenize
-        inputs = self.tokenizer(
-            formatted_prompt,
-            return_tensors="pt",
-            padding=True,
-            truncation=True,
-            max_length=2048
-        ).to(self.device)
-        
-        # Generate
-        with torch.no_grad():
-            outputs = self.model.generate(
-                **inputs,
-                max_new_tokens=max_new_tokens,
-                temperature=temperature,
-                top_p=top_p,
-                top_k=top_k,
-                do_sample=do_sample,
-                repetition_penalty=repetition_penalty,
-                eos_token_id=self.model_wrapper.get_eos_token_id(),
-                pad_token_id=self.tokenizer.pad_token_id
-            )
+        # Keep the tail so the generation prompt survives truncation
+        input_ids = self.tokenizer(formatted_prompt)["input_ids"][-self.max_prompt_tokens:]
+        
+        output_ids = self._generate_ids(
+            input_ids,
+            session=session,
+            max_new_tokens=max_new_tokens,
+            temperature=temperature,
+            top_p=top_p,
+            top_k=top_k,
+            do_sample=do_sample,
+            repetition_penalty=repetition_penalty,
+            stop_strings=stop_strings,
+            on_token=on_token,
+            adapter=adapter,
+            speculative=speculative,
+            cancel=cancel
+        )
         
         # Decode
         generated_text = self.tokenizer.decode(
-            outputs[0],
+            output_ids,
             skip_special_tokens=False
         )
         
         return generated_text
     
+    def continue_generation(
+        self,
+        session: GenerationSession,
+        text: str,
+        **kwargs
+    ) -> str:
+        """Append `text` to a session's sequence and keep decoding.
+        
+        Returns only the newly generated text.
+        """
+        appended_ids = self.tokenizer(text, add_special_tokens=False)["input_ids"]
+        input_ids = session.token_ids + appended_ids
+        
+        output_ids = self._generate_ids(input_ids, session=session, **kwargs)
+        
+        new_text = self.tokenizer.decode(
+            output_ids[len(input_ids):],
+            skip_special_tokens=False
+        )
+        return new_text.replace("<|im_end|>", "").strip()
+    
+    def _next_tool_call(self, session: GenerationSession, **kwargs) -> Optional[str]:
+        """Decode the tool call that directly follows a closed one, if any.
+        
+        New tokens are held back until they either open another call, which
+        is then decoded to its end and streamed, or can no longer do so; in
+        that case decoding stops at once (usually after a single token) and
+        the session is rolled back to where it was.
+        """
+        token_ids = list(session.token_ids)
+        on_token = kwargs.pop("on_token", None)
+        cancel = kwargs.pop("cancel", None)
+        opening = self.tool_router.tool_call_start
+        not_a_call = threading.Event()
+        held: List[int] = []
+        opened = []
+        
+        def watch(token_id: int):
+            if cancel is not None and cancel.is_set():
+                not_a_call.set()  # Re-raised as a cancellation below
+            elif opened:
+                if on_token is not None:
+                    on_token(token_id)
+            else:
+                held.append(token_id)
+                text = self.tokenizer.decode(held, skip_special_tokens=False).lstrip()
+                if text.startswith(opening):
+                    opened.append(True)
+                    if on_token is not None:
+                        for held_id in held:
+                            on_token(held_id)
+                elif not opening.startswith(text) or len(held) >= self.tool_call_lookahead:
+                    not_a_call.set()
+        
+        try:
+            text = self.continue_generation(session, "", on_token=watch, cancel=not_a_call, **kwargs)
+        except GenerationCancelled:
+            if cancel is not None and cancel.is_set():
+                raise
+            text = ""
+        if not text.startswith(opening):
+            # Tokens past the rollback point are never reused from the cache
+            session.token_ids = token_ids
+            return None
+        return text
+    
+    def _generate_ids(
+        self,
+        input_ids: List[int],
+        session: Optional[GenerationSession] = None,
+        stop_strings: Optional[List[str]] = None,
+        on_token: Optional[Callable[[int], None]] = None,
+        adapter: Optional[str] = None,
+        speculative: Optional[bool] = None,
+        cancel: Optional[threading.Event] = None,
+        **sampling
+    ) -> List[int]:
+        """Generate from token ids and return prompt + generated ids"""
+        
+        if speculative is None:
+            speculative = self.speculative
+        speculative = speculative and self.drafter is not None
+        
+        if self.scheduler is not None:
+            reused = session.reusable_prefix(input_ids) if session else 0
+            past = slice_positions(session.cache, 0, reused) if reused else None
+            
+            request = self.scheduler.submit(
+                input_ids[reused:],
+                past=past,
+                prefix_ids=input_ids[:reused],
+                return_cache=session is not None,
+                stop_strings=stop_strings,
+                on_token=on_token,
+                adapter=adapter,
+                speculative=speculative,
+                cancel=cancel,
+                **sampling
+            )
+            result = request.result()
+            output_ids = input_ids + result["token_ids"]
+            cache = result["cache"]
+        else:
+            reused = 0
+            inputs = torch.tensor([input_ids], device=self.device)
+            
+            adapter = self.model_wrapper.resolve_adapter(adapter)
+            if not sampling.get("do_sample", True) or sampling.get("temperature", 1.0) <= 0:
+                # generate() rejects a zero temperature even for greedy decoding
+                sampling.update(do_sample=False, temperature=None)
+            if speculative:
+                sampling.update(self.drafter.generate_kwargs())
+            
+            # Generate
+            with self.model_wrapper.lock, torch.no_grad():
+                outputs = self.model_wrapper.get_model().generate(
+                    input_ids=inputs,
+                    attention_mask=torch.ones_like(inputs),
+                    stop_strings=stop_strings,
+                    tokenizer=self.tokenizer if stop_strings else None,
+                    streamer=_CallbackStreamer(on_token) if on_token else None,
+                    stopping_criteria=StoppingCriteriaList([_CancelCriteria(cancel)]) if cancel else None,
+                    eos_token_id=self.model_wrapper.get_eos_token_id(),
+                    pad_token_id=self.tokenizer.pad_token_id,
+                    **self.model_wrapper.adapter_kwargs([adapter]),
+                    **sampling
+                )
+            output_ids = outputs[0].tolist()
+            cache = None
+            if cancel is not None and cancel.is_set():
+                raise GenerationCancelled()
+        
+        if session is not None:
+            session.token_ids = output_ids
+            session.cache = cache
+            session.reused_tokens += reused
+            session.prefilled_tokens += len(input_ids) - reused
+        
+        return output_ids
+    
     def extract_answer(self, generated_text: str) -> str:
         """Extract just the assistant's response"""
         if "<|im_start|>assistant" in generated_text:
             answer = generated_text.split("<|im_start|>assistant")[-1]
             answer = answer.replace("<|im_end|>", "").strip()
             return answer
-        return generated_text.strip()
\ No newline at end of file
+        return generated_text.strip()
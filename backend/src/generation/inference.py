@@ -1,12 +1,18 @@
 import os
 """Main inference pipeline with tool support"""
-from typing import Dict, List, Optional
+import threading
+import time
+from typing import Callable, Dict, List, Optional
 from src.transformer.model import MathTransformerModel
-from src.generation.generator import MathGenerator
+from src.generation.generator import MathGenerator, TokenStreamer
+from src.generation.scheduler import GenerationScheduler
+from src.generation.speculative import PromptLookupDrafter, DraftModelDrafter
+from src.generation.solution_cache import SolutionCache
 from src.generation.prompts import PromptTemplate
 from src.input_processing import UniversalMathInputProcessor
 from src.output.formatter import OutputFormatter
 from src.tools.tool_registry import tool_registry
+from src.tools.tool_cache import tool_cache, MemoryCacheBackend, DiskCacheBackend
 
 # --- NEW: Import the specific tools ---
 from src.tools.sympy_solver import SymPySolver
@@ -24,30 +30,93 @@ class MathSolverInference:
         lora_adapter_path: str = ".\models\lora_adapter",
         enable_tools: bool = True,
         enable_wolfram: bool = False,
-        wolfram_api_key: str = None
+        wolfram_api_key: str = None,
+        enable_batching: bool = True,
+        max_batch_size: int = 8,
+        merged_cache_dir: str = None,
+        precision: str = None,
+        quantized_cache_dir: str = None,
+        speculative: str = None,
+        draft_model_id: str = None,
+        solution_cache_path: str = None,
+        allow_cached_sampling: bool = None,
+        tool_cache_path: str = None
     ):
         print("🚀 Initializing Math Solver Pipeline...")
         if wolfram_api_key is None:
             wolfram_api_key = os.getenv('WOLFRAM_API_KEY')
+        if merged_cache_dir is None:
+            # e.g. ./models/merged: boot from a pre-merged safetensors artifact
+            merged_cache_dir = os.getenv('MERGED_MODEL_DIR')
+        if precision is None:
+            # bf16 (default), int8 or int4; quantized modes are CPU-only
+            precision = os.getenv('MODEL_PRECISION', 'bf16')
+        if quantized_cache_dir is None:
+            quantized_cache_dir = os.getenv('QUANTIZED_MODEL_DIR')
+        if speculative is None:
+            # prompt_lookup (default), draft_model or off
+            speculative = os.getenv('SPECULATIVE_DECODING', 'prompt_lookup')
+        if draft_model_id is None:
+            draft_model_id = os.getenv('DRAFT_MODEL_ID')
+        if solution_cache_path is None:
+            # Empty string keeps the solution cache in memory only
+            solution_cache_path = os.getenv('SOLUTION_CACHE_PATH', './cache/solutions.sqlite3')
+        if tool_cache_path is None:
+            # Shared by every worker process; empty string keeps tool results in memory only
+            tool_cache_path = os.getenv('TOOL_CACHE_PATH', './cache/tools.sqlite3')
+        if allow_cached_sampling is None:
+            allow_cached_sampling = os.getenv('SOLUTION_CACHE_ALLOW_SAMPLED', 'false').lower() == 'true'
         # Initialize components
         self.input_processor = UniversalMathInputProcessor()
         self.model_wrapper = MathTransformerModel(
             base_model_id=base_model_id,
-            lora_adapter_path=lora_adapter_path
+            lora_adapter_path=lora_adapter_path,
+            merged_cache_dir=merged_cache_dir,
+            precision=precision,
+            quantized_cache_dir=quantized_cache_dir
+        )
+        
+        self.drafter = self._create_drafter(speculative, draft_model_id)
+        
+        # Concurrent solves share one decode loop instead of queueing on the model
+        self.scheduler = None
+        if enable_batching:
+            self.scheduler = GenerationScheduler(
+                self.model_wrapper,
+                max_batch_size=max_batch_size,
+                drafter=self.drafter
+            )
+            self.scheduler.start()
+            print(f"⚡ Continuous batching enabled (max batch size: {max_batch_size})")
+        
+        self.generator = MathGenerator(
+            self.model_wrapper,
+            scheduler=self.scheduler,
+            drafter=self.drafter
         )
-        self.generator = MathGenerator(self.model_wrapper)
         self.output_formatter = OutputFormatter()
+        # Repeated deterministic problems are answered without generating
+        self.solution_cache = SolutionCache(solution_cache_path or None)
+        self.allow_cached_sampling = allow_cached_sampling
         self.enable_tools = enable_tools
         self.enable_wolfram = enable_wolfram
         
         # --- NEW: Register the tools if enabled ---
         if enable_tools:
             print("⚙️  Registering tools...")
+            backends = [MemoryCacheBackend()]
+            if tool_cache_path:
+                backends.append(DiskCacheBackend(tool_cache_path))
+            tool_cache.configure(backends)
+            
             # We must manually register each tool we want the Agent to use
             tool_registry.register(SymPySolver())
             tool_registry.register(NumpyCalculator())
             tool_registry.register(MatplotlibPlotter())
-            tool_registry.register(CodeExecutor())
+            tool_registry.register(CodeExecutor(
+                cache_results=os.getenv('CACHE_CODE_EXECUTOR', 'false').lower() == 'true',
+                pool_size=int(os.getenv('CODE_SANDBOX_WORKERS', '2'))
+            ))
 
             if enable_wolfram:
                 if wolfram_api_key:
@@ -71,17 +140,37 @@ class MathSolverInference:
         max_tokens: int = 512,
         temperature: float = 0.7,
         use_tools: bool = None,
-        return_raw: bool = False
+        return_raw: bool = False,
+        on_event: Optional[Callable[[Dict], None]] = None,
+        adapter: Optional[str] = None,
+        allow_cached: bool = None,
+        cancel: Optional[threading.Event] = None
     ) -> Dict:
-        """Solve a math problem with optional tool calling"""
+        """Solve a math problem with optional tool calling.
+        
+        `on_event` receives token deltas (and tool events) while generating.
+        `adapter` selects one of the loaded LoRA adapters (default: startup one).
+        Results are cached when sampling is deterministic (temperature <= 0)
+        or `allow_cached` is set. Setting `cancel` raises GenerationCancelled.
+        """
         
         use_tools = use_tools if use_tools is not None else self.enable_tools
+        adapter = self.model_wrapper.resolve_adapter(adapter)  # Fail fast on unknown names
         if system_prompt is None:
             system_prompt = "with_tools" if use_tools else "step_by_step"
         
         # 1. Process input
         processed_problem = self.input_processor.process(problem)
         
+        # Serve repeated problems from the solution cache
+        cache_key, model_version, cached = self._lookup_cache(
+            processed_problem, system_prompt, adapter, max_tokens, temperature, use_tools, allow_cached
+        )
+        if cached is not None:
+            if on_event is not None:
+                on_event({"type": "token", "text": cached["solution"]})
+            return cached
+        
         # 2. Create messages
         messages = PromptTemplate.create_messages(
             processed_problem,
@@ -93,37 +182,195 @@ class MathSolverInference:
             generation_result = self.generator.generate_with_tools(
                 messages,
                 max_new_tokens=max_tokens,
-                temperature=temperature
+                temperature=temperature,
+                on_event=on_event,
+                adapter=adapter,
+                cancel=cancel
             )
             answer = generation_result["final_answer"]
             tool_calls = generation_result.get("tool_calls", [])
         else:
+            streamer = None
+            if on_event is not None:
+                streamer = TokenStreamer(
+                    self.generator.tokenizer,
+                    lambda text: on_event({"type": "token", "text": text})
+                )
             raw_output = self.generator.generate(
                 messages,
                 max_new_tokens=max_tokens,
-                temperature=temperature
+                temperature=temperature,
+                on_token=streamer.put if streamer else None,
+                adapter=adapter,
+                cancel=cancel
             )
             answer = self.generator.extract_answer(raw_output)
             tool_calls = []
         
         # 4. Format output
-        formatted_output = self.output_formatter.format(answer)
-        final_answer = self.output_formatter.extract_final_answer(answer)
+        result = self._build_result(processed_problem, answer, tool_calls)
         
-        result = {
-            "problem": processed_problem,
-            "solution": answer,
-            "formatted": formatted_output,
-            "final_answer": final_answer,
-            "tool_calls": tool_calls,
-            "tools_used": len(tool_calls) > 0
-        }
+        if cache_key is not None:
+            self.solution_cache.put(cache_key, adapter, model_version, dict(result))
         
         if return_raw and not use_tools:
             result["raw_output"] = raw_output
         
         return result
     
+    def solve_batch(
+        self,
+        problems: List[str],
+        system_prompt: str = None,
+        max_tokens: int = 512,
+        temperature: float = 0.7,
+        use_tools: bool = None,
+        adapter: Optional[str] = None,
+        allow_cached: bool = None
+    ) -> List[Dict]:
+        """Solve a problem set in shared generation batches.
+        
+        Cached problems are answered directly; the rest go through
+        MathGenerator.generate_batch together. Results keep the order of
+        `problems` and carry `seconds` until each one finished.
+        """
+        started = time.perf_counter()
+        use_tools = use_tools if use_tools is not None else self.enable_tools
+        adapter = self.model_wrapper.resolve_adapter(adapter)
+        if system_prompt is None:
+            system_prompt = "with_tools" if use_tools else "step_by_step"
+        
+        results: List[Optional[Dict]] = [None] * len(problems)
+        pending = []  # (index, processed problem, cache key, model version)
+        for index, problem in enumerate(problems):
+            processed_problem = self.input_processor.process(problem)
+            cache_key, model_version, cached = self._lookup_cache(
+                processed_problem, system_prompt, adapter, max_tokens, temperature, use_tools, allow_cached
+            )
+            if cached is not None:
+                results[index] = {**cached, "seconds": round(time.perf_counter() - started, 3)}
+            else:
+                pending.append((index, processed_problem, cache_key, model_version))
+        
+        if pending:
+            generation_offset = time.perf_counter() - started  # Input processing and cache lookups
+            generated = self.generator.generate_batch(
+                [
+                    PromptTemplate.create_messages(processed_problem, system_prompt=system_prompt)
+                    for _, processed_problem, _, _ in pending
+                ],
+                max_new_tokens=max_tokens,
+                temperature=temperature,
+                use_tools=use_tools,
+                adapter=adapter
+            )
+            for (index, processed_problem, cache_key, model_version), generation in zip(pending, generated):
+                result = self._build_result(processed_problem, generation["final_answer"], generation["tool_calls"])
+                if cache_key is not None:
+                    self.solution_cache.put(cache_key, adapter, model_version, dict(result))
+                result["seconds"] = round(generation_offset + generation["seconds"], 3)
+                results[index] = result
+        
+        return results
+    
+    def warmup(self, prompt_lengths=(64, 256, 1024), max_new_tokens: int = 16) -> List[Dict]:
+        """Run the prefill and decode paths once per typical prompt length.
+        
+        First generations pay one-off costs (kernel selection, allocator
+        growth, cache setup); paying them here keeps them off real requests.
+        Returns the time taken by each warmup generation.
+        """
+        filler = "Solve for x: 2x + 5 = 17. "
+        filler_tokens = max(1, len(self.generator.tokenizer(filler)["input_ids"]))
+        batch = []
+        timings = []
+        for length in prompt_lengths:
+            length = min(length, self.generator.max_prompt_tokens)
+            messages = PromptTemplate.create_messages(
+                filler * max(1, length // filler_tokens),
+                system_prompt="step_by_step"
+            )
+            batch.append(messages)
+            started = time.perf_counter()
+            self.generator.generate(messages, max_new_tokens=max_new_tokens, do_sample=False)
+            timings.append({"prompt_tokens": length, "seconds": round(time.perf_counter() - started, 3)})
+            print(f"🔥 Warmup ({length} prompt tokens): {timings[-1]['seconds']}s")
+        
+        # Several sequences at once take the batched decode path
+        started = time.perf_counter()
+        self.generator.generate_batch(batch, max_new_tokens=max_new_tokens, do_sample=False, use_tools=False)
+        timings.append({"batch_size": len(batch), "seconds": round(time.perf_counter() - started, 3)})
+        print(f"🔥 Warmup (batch of {len(batch)}): {timings[-1]['seconds']}s")
+        return timings
+    
+    def _lookup_cache(
+        self,
+        processed_problem: str,
+        system_prompt: str,
+        adapter: str,
+        max_tokens: int,
+        temperature: float,
+        use_tools: bool,
+        allow_cached: bool = None
+    ):
+        """Return (cache key, model version, cached result); the key is None when caching is off.
+        
+        Results are cached when sampling is deterministic (temperature <= 0)
+        or `allow_cached` is set.
+        """
+        if allow_cached is None:
+            allow_cached = self.allow_cached_sampling
+        if not (temperature <= 0 or allow_cached):
+            return None, None, None
+        model_version = self.model_wrapper.model_version(adapter)
+        cache_key = self.solution_cache.make_key(
+            processed_problem,
+            system_prompt,
+            adapter,
+            {
+                "max_tokens": max_tokens,
+                "temperature": temperature,
+                "use_tools": use_tools,
+                "tools": sorted(tool_registry.list_tools()) if use_tools else [],
+            },
+            model_version
+        )
+        cached = self.solution_cache.get(cache_key, adapter, model_version)
+        if cached is not None:
+            cached = {**cached, "cached": True}
+        return cache_key, model_version, cached
+    
+    def _build_result(self, processed_problem: str, answer: str, tool_calls: List[Dict]) -> Dict:
+        return {
+            "problem": processed_problem,
+            "solution": answer,
+            "formatted": self.output_formatter.format(answer),
+            "final_answer": self.output_formatter.extract_final_answer(answer),
+            "tool_calls": tool_calls,
+            "tools_used": len(tool_calls) > 0
+        }
+    
+    def _create_drafter(self, mode: str, draft_model_id: str = None):
+        """Build the draft proposer for speculative decoding"""
+        if mode in (None, "", "off", "none"):
+            return None
+        if mode == "prompt_lookup":
+            print("⚡ Speculative decoding: prompt lookup")
+            return PromptLookupDrafter()
+        if mode == "draft_model":
+            if not draft_model_id:
+                raise ValueError("SPECULATIVE_DECODING=draft_model needs DRAFT_MODEL_ID")
+            from transformers import AutoModelForCausalLM
+            print(f"⚡ Speculative decoding: draft model {draft_model_id}")
+            draft_model = AutoModelForCausalLM.from_pretrained(
+                draft_model_id,
+                torch_dtype=self.model_wrapper.get_model().dtype,
+                low_cpu_mem_usage=True
+            ).to(self.model_wrapper.device)
+            draft_model.eval()
+            return DraftModelDrafter(draft_model)
+        raise ValueError(f"Unknown speculative decoding mode: {mode}")
+    
     def get_available_tools(self) -> Dict[str, str]:
         """Get list of available tools"""
         return tool_registry.list_tools()
\ No newline at end of file
@@ -0,0 +1,62 @@
+"""Helpers for manipulating KV caches across transformers versions"""
+from typing import List, Tuple
+import torch
+from transformers import DynamicCache
+
+# One (key, value) pair per decoder layer, each shaped (batch, heads, seq, head_dim)
+Layers = List[Tuple[torch.Tensor, torch.Tensor]]
+
+
+def cache_to_layers(cache) -> Layers:
+    """Return a model cache as a list of (key, value) tensors per layer"""
+    if cache is None:
+        return []
+    if isinstance(cache, (list, tuple)):
+        return [(key, value) for key, value in cache]
+    if hasattr(cache, "layers"):  # transformers >= 4.56
+        return [(layer.keys, layer.values) for layer in cache.layers]
+    return list(zip(cache.key_cache, cache.value_cache))
+
+
+def layers_to_cache(layers: Layers) -> DynamicCache:
+    """Build a DynamicCache the model can consume from per-layer tensors"""
+    cache = DynamicCache()
+    for layer_idx, (key, value) in enumerate(layers):
+        cache.update(key, value, layer_idx)
+    return cache
+
+
+def seq_length(layers: Layers) -> int:
+    """Number of cached positions"""
+    return layers[0][0].shape[-2] if layers else 0
+
+
+def pad_left(layers: Layers, pad: int) -> Layers:
+    """Prepend `pad` zero positions to every row"""
+    if pad <= 0:
+        return layers
+    padded = []
+    for key, value in layers:
+        shape = list(key.shape)
+        shape[-2] = pad
+        zeros = key.new_zeros(shape)
+        padded.append((torch.cat([zeros, key], dim=-2), torch.cat([zeros, value], dim=-2)))
+    return padded
+
+
+def concat_rows(first: Layers, second: Layers) -> Layers:
+    """Stack two caches of equal length along the batch dimension"""
+    return [
+        (torch.cat([k1, k2], dim=0), torch.cat([v1, v2], dim=0))
+        for (k1, v1), (k2, v2) in zip(first, second)
+    ]
+
+
+def select_rows(layers: Layers, index: torch.Tensor) -> Layers:
+    """Keep only the given batch rows"""
+    return [(key.index_select(0, index), value.index_select(0, index)) for key, value in layers]
+
+
+def slice_positions(layers: Layers, start: int = 0, end: int = None) -> Layers:
+    """Keep cached positions [start:end]"""
+    return [(key[..., start:end, :], value[..., start:end, :]) for key, value in layers]
@@ -14,6 +14,7 @@ Available tools:
   
 - numpy_calculator: For numerical calculations
   Example: trigonometry, arithmetic, square roots, exponentials
+  Evaluate several "expressions" at once over "variables" (lists of values); set "grid": true for every combination
   
 - matplotlib_plotter: For creating graphs and visualizations
   Example: plot functions, scatter plots, bar charts
@@ -45,6 +46,12 @@ tool: numpy_calculator
 params: {"expression": "sin(pi/4) * sqrt(2)"}
 </tool_call>
 
+Evaluating over a range of values:
+<tool_call>
+tool: numpy_calculator
+params: {"expressions": ["a * x**2", "a * x"], "variables": {"x": [0, 1, 2], "a": [1, 2]}, "grid": true}
+</tool_call>
+
 Query Wolfram Alpha:
 <tool_call>
 tool: wolfram_alpha
@@ -0,0 +1,546 @@
+"""Continuous-batching scheduler: one shared decode loop for all requests"""
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional
+
+import torch
+
+from src.transformer.model import BASE_ADAPTER
+from src.generation.kv_cache import (
+    Layers,
+    cache_to_layers,
+    layers_to_cache,
+    seq_length,
+    pad_left,
+    concat_rows,
+    select_rows,
+    slice_positions,
+)
+
+
+class GenerationCancelled(Exception):
+    """Raised for requests whose cancel event was set before they finished"""
+
+
+class GenerationRequest:
+    """A single sequence tracked by the scheduler"""
+
+    _ids = itertools.count()
+
+    def __init__(
+        self,
+        input_ids: List[int],
+        max_new_tokens: int = 512,
+        temperature: float = 0.7,
+        top_p: float = 0.9,
+        top_k: int = 50,
+        do_sample: bool = True,
+        repetition_penalty: float = 1.1,
+        past: Optional[Layers] = None,
+        prefix_ids: Optional[List[int]] = None,
+        return_cache: bool = False,
+        stop_strings: Optional[List[str]] = None,
+        on_token: Optional[Callable[[int], None]] = None,
+        adapter: Optional[str] = None,
+        speculative: bool = False,
+        cancel: Optional[threading.Event] = None
+    ):
+        self.request_id = next(self._ids)
+        self.input_ids = list(input_ids)
+        # KV cache covering `prefix_ids`, which precede `input_ids`
+        self.past = past
+        self.prefix_ids = list(prefix_ids or [])
+        self.return_cache = return_cache
+        self.stop_strings = list(stop_strings or [])
+        self.on_token = on_token  # Called from the scheduler thread for streaming
+        self.adapter = adapter    # LoRA adapter name, resolved by the model wrapper
+        self.speculative = speculative  # Draft and verify several tokens per step
+        self.cancel = cancel            # Set by the caller to abandon the request
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.top_p = top_p
+        self.top_k = top_k
+        self.do_sample = do_sample
+        self.repetition_penalty = repetition_penalty
+
+        self.generated: List[int] = []
+        self.seen_ids = set(self.prefix_ids) | set(self.input_ids)  # For the repetition penalty
+        self.finish_reason: Optional[str] = None
+        self.cache: Optional[Layers] = None
+        self.draft_proposed = 0
+        self.draft_accepted = 0
+        self.submitted_at = time.perf_counter()
+        self.future: Future = Future()
+
+    def result(self, timeout: float = None) -> Dict:
+        """Block until the sequence has finished"""
+        return self.future.result(timeout)
+
+
+class GenerationScheduler:
+    """Runs every in-flight sequence through one shared decode loop.
+
+    New sequences are prefilled on their own and merged into the running
+    batch (left-padded to a common cache length); finished sequences are
+    retired after every step, so the batch changes at token granularity.
+
+    With a `drafter`, a speculative request that has the model to itself
+    gets several drafted tokens verified in one forward pass per step.
+    """
+
+    def __init__(self, model_wrapper, max_batch_size: int = 8, drafter=None):
+        self.model_wrapper = model_wrapper
+        self.tokenizer = model_wrapper.get_tokenizer()
+        self.device = model_wrapper.device
+        self.eos_token_id = model_wrapper.get_eos_token_id()
+        self.max_batch_size = max_batch_size
+        self.drafter = drafter  # PromptLookupDrafter / DraftModelDrafter
+
+        self._pending: List[GenerationRequest] = []
+        self._active: List[GenerationRequest] = []
+        self._cache = None             # Batched KV cache of the active rows
+        self._attention_mask = None    # (batch, cache_len), 0 marks left padding
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+        self.steps = 0
+        self.prefill_tokens = 0
+        self.tokens_generated = 0
+        self.busy_seconds = 0.0
+        self.speculative_steps = 0
+        self.draft_proposed = 0
+        self.draft_accepted = 0
+
+    # ------------------------------------------------------------------ #
+    # Public API
+    # ------------------------------------------------------------------ #
+    def start(self):
+        """Start the background decode loop"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name="generation-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the decode loop and fail anything still in flight"""
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread:
+            self._thread.join()
+        self._fail_all(RuntimeError("Generation scheduler stopped"), include_pending=True)
+
+    def submit(self, input_ids: List[int], **options) -> GenerationRequest:
+        """Queue a prompt for generation and return its request handle.
+
+        Pass `past`/`prefix_ids` to continue from a cache returned by an
+        earlier request (`return_cache=True`); only `input_ids` is prefilled.
+        """
+        options["adapter"] = self.model_wrapper.resolve_adapter(options.get("adapter"))
+        request = GenerationRequest(input_ids, **options)
+        with self._condition:
+            self._pending.append(request)
+            self._condition.notify()
+        return request
+
+    def stats(self) -> Dict:
+        """Current load and throughput"""
+        return {
+            "active": len(self._active),
+            "pending": len(self._pending),
+            "steps": self.steps,
+            "prefill_tokens": self.prefill_tokens,
+            "tokens_generated": self.tokens_generated,
+            "tokens_per_second": (
+                self.tokens_generated / self.busy_seconds if self.busy_seconds else 0.0
+            ),
+            "speculative": {
+                "steps": self.speculative_steps,
+                "proposed": self.draft_proposed,
+                "accepted": self.draft_accepted,
+                "acceptance_rate": (
+                    self.draft_accepted / self.draft_proposed if self.draft_proposed else 0.0
+                ),
+            },
+        }
+
+    # ------------------------------------------------------------------ #
+    # Decode loop
+    # ------------------------------------------------------------------ #
+    def _loop(self):
+        while True:
+            with self._condition:
+                while self._running and not self._pending and not self._active:
+                    self._condition.wait()
+                if not self._running:
+                    return
+                admitted = self._admit()
+
+            started = time.perf_counter()
+            try:
+                with self.model_wrapper.lock, torch.no_grad():
+                    admitted = self._drop_unloaded_adapters(admitted)
+                    for request in admitted:
+                        self._prefill_one(request)
+                    # After prefill, so a request cancelled by its first token never decodes
+                    self._drop_cancelled()
+                    if self._speculation_allowed():
+                        self._speculative_step()
+                    elif self._active:
+                        self._decode_step()
+            except Exception as e:
+                self._fail_all(e, admitted)
+            self.busy_seconds += time.perf_counter() - started
+
+    def _admit(self) -> List[GenerationRequest]:
+        """Take queued requests into free batch slots.
+
+        Requests whose adapter is already running go first, so sequences
+        sharing an adapter end up decoding together. A request queued before
+        the oldest running sequence started beats that preference, so other
+        adapters cannot starve under steady load on one adapter.
+        """
+        cancelled = [request for request in self._pending if self._is_cancelled(request)]
+        for request in cancelled:
+            self._pending.remove(request)
+            request.future.set_exception(GenerationCancelled())
+
+        free_slots = self.max_batch_size - len(self._active)
+        if free_slots <= 0:
+            return []
+        running = {request.adapter for request in self._active}
+        oldest_running = min((request.submitted_at for request in self._active), default=float("inf"))
+        ordered = sorted(
+            self._pending,
+            key=lambda request: (
+                request.submitted_at >= oldest_running,  # Overdue requests first
+                request.adapter not in running,
+                request.submitted_at
+            )
+        )
+        admitted = ordered[:free_slots]
+        self._pending = [request for request in self._pending if request not in admitted]
+        return admitted
+
+    def _drop_unloaded_adapters(self, admitted: List[GenerationRequest]) -> List[GenerationRequest]:
+        """Fail sequences whose adapter was unloaded while they were queued or running.
+
+        Returns the admitted requests that can still be prefilled.
+        """
+        available = set(self.model_wrapper.list_adapters()) | {BASE_ADAPTER}
+        orphaned = [
+            row for row, request in enumerate(self._active)
+            if request.adapter not in available
+        ]
+        if orphaned:
+            self._retire(orphaned, error=ValueError("Adapter was unloaded during generation"))
+
+        runnable = []
+        for request in admitted:
+            if request.adapter in available:
+                runnable.append(request)
+            else:
+                request.future.set_exception(ValueError(f"Adapter '{request.adapter}' was unloaded"))
+        return runnable
+
+    def _prefill_one(self, request: GenerationRequest):
+        """Prefill one request; an error fails only that request, not the batch"""
+        try:
+            self._prefill(request)
+        except Exception as e:
+            if not request.future.done():
+                request.future.set_exception(e)
+
+    def _drop_cancelled(self):
+        """Free the batch rows of requests their callers gave up on"""
+        cancelled = [
+            row for row, request in enumerate(self._active)
+            if self._is_cancelled(request)
+        ]
+        if cancelled:
+            self._retire(cancelled, error=GenerationCancelled())
+
+    def _prefill(self, request: GenerationRequest):
+        """Run the prompt through the model and merge the sequence into the batch"""
+        model = self.model_wrapper.get_model()
+        input_ids = torch.tensor([request.input_ids], device=self.device)
+
+        if request.past:
+            # Only the new suffix is prefilled on top of the reused prefix cache
+            past_len = seq_length(request.past)
+            total_len = past_len + len(request.input_ids)
+            outputs = model(
+                input_ids=input_ids,
+                attention_mask=torch.ones((1, total_len), dtype=torch.long, device=self.device),
+                position_ids=torch.arange(past_len, total_len, device=self.device).unsqueeze(0),
+                past_key_values=layers_to_cache(request.past),
+                use_cache=True,
+                **self.model_wrapper.adapter_kwargs([request.adapter])
+            )
+            request.past = None
+        else:
+            outputs = model(
+                input_ids=input_ids,
+                use_cache=True,
+                **self.model_wrapper.adapter_kwargs([request.adapter])
+            )
+        self.prefill_tokens += len(request.input_ids)
+
+        new_layers = cache_to_layers(outputs.past_key_values)
+        if self._append_token(request, outputs.logits[0, -1]):
+            if request.return_cache:
+                request.cache = new_layers
+            self._finish(request)
+            return
+
+        new_mask = torch.ones((1, seq_length(new_layers)), dtype=torch.long, device=self.device)
+
+        if not self._active:
+            cache, attention_mask = layers_to_cache(new_layers), new_mask
+        else:
+            layers = cache_to_layers(self._cache)
+            target = max(seq_length(layers), seq_length(new_layers))
+            layers = pad_left(layers, target - seq_length(layers))
+            new_layers = pad_left(new_layers, target - seq_length(new_layers))
+            cache = layers_to_cache(concat_rows(layers, new_layers))
+            attention_mask = torch.cat([
+                self._pad_mask(self._attention_mask, target),
+                self._pad_mask(new_mask, target),
+            ], dim=0)
+        # Swapped in together, so a failed merge leaves the running batch intact
+        self._cache, self._attention_mask = cache, attention_mask
+        self._active.append(request)
+
+    def _decode_step(self):
+        """Advance every active sequence by one token"""
+        model = self.model_wrapper.get_model()
+        batch_size = len(self._active)
+        input_ids = torch.tensor(
+            [[request.generated[-1]] for request in self._active],
+            device=self.device
+        )
+        # Left padding shifts positions, so count only the real tokens
+        position_ids = self._attention_mask.sum(dim=-1, keepdim=True)
+        attention_mask = torch.cat([
+            self._attention_mask,
+            self._attention_mask.new_ones((batch_size, 1))
+        ], dim=-1)
+
+        outputs = model(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            position_ids=position_ids,
+            past_key_values=self._cache,
+            use_cache=True,
+            # Mixed adapters share the base matmuls; PEFT groups rows per adapter
+            **self.model_wrapper.adapter_kwargs(request.adapter for request in self._active)
+        )
+        self._cache = outputs.past_key_values
+        self._attention_mask = attention_mask
+        self.steps += 1
+
+        finished_rows = [
+            row for row, request in enumerate(self._active)
+            if self._append_token(request, outputs.logits[row, -1])
+        ]
+        if finished_rows:
+            self._retire(finished_rows)
+
+    def _speculation_allowed(self) -> bool:
+        """Speculate only while a single sequence has the model to itself"""
+        return (
+            self.drafter is not None
+            and len(self._active) == 1
+            and self._active[0].speculative
+            and not self._pending
+        )
+
+    def _speculative_step(self):
+        """Verify drafted tokens in one forward pass and keep the accepted prefix"""
+        request = self._active[0]
+        context = request.prefix_ids + request.input_ids + request.generated
+        # The last accepted position always yields one token of its own
+        budget = request.max_new_tokens - len(request.generated) - 1
+        draft = self.drafter.propose(context, budget)
+        if not draft:
+            self._decode_step()
+            return
+
+        model = self.model_wrapper.get_model()
+        # A lone row carries no left padding, so positions are plain offsets
+        past_len = self._attention_mask.shape[-1]
+        total_len = past_len + 1 + len(draft)
+        outputs = model(
+            input_ids=torch.tensor([[request.generated[-1]] + draft], device=self.device),
+            attention_mask=self._attention_mask.new_ones((1, total_len)),
+            position_ids=torch.arange(past_len, total_len, device=self.device).unsqueeze(0),
+            past_key_values=self._cache,
+            use_cache=True,
+            **self.model_wrapper.adapter_kwargs([request.adapter])
+        )
+        self.steps += 1
+        self.speculative_steps += 1
+
+        # Sample from the target at each position and stop at the first
+        # disagreement, which keeps the output distribution unchanged
+        accepted = 0
+        finished = False
+        for position in range(len(draft) + 1):
+            finished = self._append_token(request, outputs.logits[0, position])
+            if finished or position == len(draft) or request.generated[-1] != draft[position]:
+                break
+            accepted += 1
+
+        request.draft_proposed += len(draft)
+        request.draft_accepted += accepted
+        self.draft_proposed += len(draft)
+        self.draft_accepted += accepted
+
+        # Drop the cache entries of rejected draft tokens
+        kept_len = past_len + accepted + 1
+        self._cache = layers_to_cache(
+            slice_positions(cache_to_layers(outputs.past_key_values), 0, kept_len)
+        )
+        self._attention_mask = self._attention_mask.new_ones((1, kept_len))
+        if finished:
+            self._retire([0])
+
+    def _retire(self, rows: List[int], error: Optional[Exception] = None):
+        """Drop finished rows from the batch and resolve their futures"""
+        finished = [self._active[row] for row in rows]
+        keep = [row for row in range(len(self._active)) if row not in rows]
+        layers = cache_to_layers(self._cache)
+
+        for row, request in zip(rows, finished):
+            if request.return_cache:
+                # Hand back the row's own cache without the left padding
+                real_len = int(self._attention_mask[row].sum())
+                row_index = torch.tensor([row], device=self.device)
+                request.cache = slice_positions(select_rows(layers, row_index), -real_len)
+
+        self._active = [self._active[row] for row in keep]
+
+        if self._active:
+            index = torch.tensor(keep, device=self.device)
+            layers = select_rows(layers, index)
+            mask = self._attention_mask.index_select(0, index)
+            # Trim columns that are now padding for every remaining row
+            first_real = int((mask.sum(dim=0) > 0).nonzero()[0])
+            self._cache = layers_to_cache(slice_positions(layers, first_real))
+            self._attention_mask = mask[:, first_real:]
+        else:
+            self._cache = None
+            self._attention_mask = None
+
+        for request in finished:
+            if error is not None:
+                request.future.set_exception(error)
+            else:
+                self._finish(request)
+
+    # ------------------------------------------------------------------ #
+    # Helpers
+    # ------------------------------------------------------------------ #
+    def _append_token(self, request: GenerationRequest, logits: torch.Tensor) -> bool:
+        """Sample the next token for a sequence; return True once it is finished"""
+        token = self._sample(logits, request)
+        request.generated.append(token)
+        request.seen_ids.add(token)
+        self.tokens_generated += 1
+        if request.on_token is not None:
+            try:
+                request.on_token(token)
+            except Exception as e:
+                print(f"⚠️  Token callback failed: {e}")
+                request.on_token = None
+
+        if token == self.eos_token_id:
+            request.finish_reason = "eos"
+        elif len(request.generated) >= request.max_new_tokens:
+            request.finish_reason = "length"
+        elif request.stop_strings and self._hit_stop_string(request):
+            request.finish_reason = "stop"
+        return request.finish_reason is not None
+
+    def _hit_stop_string(self, request: GenerationRequest) -> bool:
+        """Check whether the latest tokens complete one of the stop strings"""
+        # Every token decodes to at least one character, so this window is enough
+        window = max(len(stop) for stop in request.stop_strings) + 1
+        tail = self.tokenizer.decode(request.generated[-window:], skip_special_tokens=False)
+        return any(stop in tail for stop in request.stop_strings)
+
+    def _sample(self, logits: torch.Tensor, request: GenerationRequest) -> int:
+        """Apply the request's sampling parameters to one row of logits"""
+        logits = logits.float()
+
+        if request.repetition_penalty != 1.0 and request.seen_ids:
+            seen = torch.tensor(list(request.seen_ids), device=logits.device)
+            scores = logits[seen]
+            logits[seen] = torch.where(
+                scores < 0,
+                scores * request.repetition_penalty,
+                scores / request.repetition_penalty
+            )
+
+        if not request.do_sample or request.temperature <= 0:
+            return int(torch.argmax(logits))
+
+        logits = logits / request.temperature
+
+        if request.top_k and request.top_k > 0:
+            kth_value = torch.topk(logits, min(request.top_k, logits.size(-1))).values[-1]
+            logits[logits < kth_value] = float("-inf")
+
+        if request.top_p < 1.0:
+            sorted_logits, sorted_idx = torch.sort(logits, descending=True)
+            probs = torch.softmax(sorted_logits, dim=-1)
+            # Drop tokens once the cumulative mass before them exceeds top_p
+            remove = torch.cumsum(probs, dim=-1) - probs > request.top_p
+            sorted_logits[remove] = float("-inf")
+            logits = torch.full_like(logits, float("-inf")).scatter(0, sorted_idx, sorted_logits)
+
+        probs = torch.softmax(logits, dim=-1)
+        return int(torch.multinomial(probs, num_samples=1))
+
+    def _is_cancelled(self, request: GenerationRequest) -> bool:
+        return request.cancel is not None and request.cancel.is_set()
+
+    def _pad_mask(self, mask: torch.Tensor, length: int) -> torch.Tensor:
+        pad = length - mask.shape[-1]
+        if pad <= 0:
+            return mask
+        return torch.cat([mask.new_zeros((mask.shape[0], pad)), mask], dim=-1)
+
+    def _finish(self, request: GenerationRequest):
+        if not request.future.done():
+            request.future.set_result({
+                "token_ids": request.generated,
+                "finish_reason": request.finish_reason,
+                "cache": request.cache,
+                "latency": time.perf_counter() - request.submitted_at,
+                "draft_proposed": request.draft_proposed,
+                "draft_accepted": request.draft_accepted,
+            })
+
+    def _fail_all(
+        self,
+        error: Exception,
+        extra: List[GenerationRequest] = (),
+        include_pending: bool = False
+    ):
+        """Fail the batch (and optionally the queue) and reset the cache"""
+        with self._condition:
+            failed = self._active + list(extra)
+            self._active = []
+            if include_pending:
+                failed += self._pending
+                self._pending = []
+            self._cache = None
+            self._attention_mask = None
+        for request in failed:
+            if not request.future.done():
+                request.future.set_exception(error)
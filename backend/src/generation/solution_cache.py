@@ -0,0 +1,159 @@
+"""Two-tier cache of finished solutions: in-memory LRU over sqlite"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+class SolutionCache:
+    """Caches solve() results for repeated problems.
+
+    Keys cover everything that changes the answer. Each entry also records
+    the model version of its adapter; when an adapter's version changes, its
+    entries are dropped from both tiers.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_memory_entries: int = 1024,
+        max_disk_entries: int = 100_000
+    ):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory: "OrderedDict[str, Tuple[str, Dict]]" = OrderedDict()  # Key -> (adapter, value)
+        self._versions: Dict[str, str] = {}  # Adapter -> model version seen last
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS solutions ("
+                "key TEXT PRIMARY KEY, adapter TEXT, model_version TEXT, "
+                "value TEXT, last_used REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS solutions_adapter ON solutions (adapter)")
+            self._db.commit()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(
+        problem: str,
+        system_prompt: str,
+        adapter: str,
+        params: Dict,
+        model_version: str
+    ) -> str:
+        payload = json.dumps({
+            "problem": problem,
+            "system_prompt": system_prompt,
+            "adapter": adapter,
+            "params": params,
+            "model_version": model_version,
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str, adapter: str, model_version: str) -> Optional[Dict]:
+        """Return a cached solution, or None"""
+        with self._lock:
+            self._check_version(adapter, model_version)
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return entry[1]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value FROM solutions WHERE key = ? AND model_version = ?",
+                    (key, model_version)
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE solutions SET last_used = ? WHERE key = ?", (time.time(), key)
+                    )
+                    self._db.commit()
+                    value = json.loads(row[0])
+                    self._remember(key, adapter, value)
+                    self.disk_hits += 1
+                    return value
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, adapter: str, model_version: str, value: Dict):
+        with self._lock:
+            self._check_version(adapter, model_version)
+            self._remember(key, adapter, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO solutions VALUES (?, ?, ?, ?, ?)",
+                    (key, adapter, model_version, json.dumps(value, default=str), time.time())
+                )
+                count = self._db.execute("SELECT COUNT(*) FROM solutions").fetchone()[0]
+                if count > self.max_disk_entries:
+                    self._db.execute(
+                        "DELETE FROM solutions WHERE key IN ("
+                        "SELECT key FROM solutions ORDER BY last_used LIMIT ?)",
+                        (count - self.max_disk_entries,)
+                    )
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM solutions")
+                self._db.commit()
+
+    def stats(self) -> Dict:
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        with self._lock:
+            disk_entries = 0
+            if self._db is not None:
+                disk_entries = self._db.execute("SELECT COUNT(*) FROM solutions").fetchone()[0]
+            return {
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+    def _remember(self, key: str, adapter: str, value: Dict):
+        self._memory[key] = (adapter, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _check_version(self, adapter: str, model_version: str):
+        """Drop an adapter's entries the first time a new model version shows up"""
+        if self._versions.get(adapter) == model_version:
+            return
+        self._versions[adapter] = model_version
+        stale = [key for key, (owner, _) in self._memory.items() if owner == adapter]
+        for key in stale:
+            del self._memory[key]
+        dropped = len(stale)
+        if self._db is not None:
+            dropped += self._db.execute(
+                "DELETE FROM solutions WHERE adapter = ? AND model_version != ?",
+                (adapter, model_version)
+            ).rowcount
+            self._db.commit()
+        if dropped:
+            self.invalidations += 1
+            print(f"♻️  Model version changed for '{adapter}', dropped {dropped} cached solutions")
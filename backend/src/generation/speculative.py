@@ -0,0 +1,103 @@
+"""Draft proposers for speculative decoding"""
+from typing import Dict, List, Optional
+
+import torch
+
+from src.generation.kv_cache import Layers, cache_to_layers, layers_to_cache, slice_positions
+
+
+class PromptLookupDrafter:
+    """Drafts tokens by n-gram lookup in the sequence itself.
+
+    Math solutions copy long spans of the problem, earlier steps and tool
+    results, so the tokens that followed the most recent earlier occurrence
+    of the current suffix are a cheap guess for what comes next.
+    """
+
+    def __init__(self, num_draft_tokens: int = 8, max_ngram: int = 3, min_ngram: int = 1):
+        self.num_draft_tokens = num_draft_tokens
+        self.max_ngram = max_ngram
+        self.min_ngram = min_ngram
+
+    def propose(self, token_ids: List[int], max_tokens: int = None) -> List[int]:
+        """Return up to `max_tokens` draft tokens continuing `token_ids`"""
+        limit = self.num_draft_tokens if max_tokens is None else min(max_tokens, self.num_draft_tokens)
+        if limit <= 0:
+            return []
+        for n in range(min(self.max_ngram, len(token_ids) - 1), self.min_ngram - 1, -1):
+            pattern = token_ids[-n:]
+            # Most recent match first; the suffix itself is not a match
+            for start in range(len(token_ids) - n - 1, -1, -1):
+                if token_ids[start:start + n] == pattern:
+                    draft = token_ids[start + n:start + n + limit]
+                    if draft:
+                        return draft
+        return []
+
+    def generate_kwargs(self) -> Dict:
+        """Equivalent options for `model.generate`"""
+        return {"prompt_lookup_num_tokens": self.num_draft_tokens}
+
+
+class DraftModelDrafter:
+    """Drafts tokens greedily with a small model sharing the main tokenizer.
+
+    The draft model's KV cache is kept between calls: each call only
+    prefills the tokens appended since the last one and crops the cached
+    positions of draft tokens the target rejected.
+    """
+
+    def __init__(self, model, num_draft_tokens: int = 4, max_context: int = 1024):
+        self.model = model
+        self.num_draft_tokens = num_draft_tokens
+        self.max_context = max_context
+        self._start = 0       # Offset of the cached window in the sequence
+        self._cached_ids = []  # Tokens whose keys and values are in `_layers`
+        self._layers: Layers = []
+
+    def propose(self, token_ids: List[int], max_tokens: int = None) -> List[int]:
+        limit = self.num_draft_tokens if max_tokens is None else min(max_tokens, self.num_draft_tokens)
+        if limit <= 0 or not token_ids:
+            return []
+        reused = self._reusable_prefix(token_ids)
+        if reused is None:
+            # Another sequence, or the window is full: restart from the last half window
+            self._start = max(0, len(token_ids) - self.max_context // 2)
+            reused = 0
+        context = token_ids[self._start:]
+        # At least one token has to be fed to get logits for the next one
+        reused = min(reused, len(context) - 1)
+
+        cache = layers_to_cache(slice_positions(self._layers, 0, reused))
+        new_ids = context[reused:]
+        draft = []
+        with torch.no_grad():
+            for _ in range(limit):
+                outputs = self.model(
+                    input_ids=torch.tensor([new_ids], device=self.model.device),
+                    past_key_values=cache,
+                    use_cache=True
+                )
+                cache = outputs.past_key_values
+                new_ids = [int(outputs.logits[0, -1].argmax())]
+                draft.append(new_ids[0])
+
+        # The last draft token was never fed, so the cache ends just before it
+        self._layers = cache_to_layers(cache)
+        self._cached_ids = context + draft[:-1]
+        return draft
+
+    def _reusable_prefix(self, token_ids: List[int]) -> Optional[int]:
+        """Number of cached positions still valid for `token_ids`, or None"""
+        if not self._cached_ids or len(token_ids) - self._start > self.max_context:
+            return None
+        context = token_ids[self._start:]
+        reused = 0
+        for cached, token in zip(self._cached_ids, context):
+            if cached != token:
+                break
+            reused += 1
+        return reused or None
+
+    def generate_kwargs(self) -> Dict:
+        return {"assistant_model": self.model}
@@ -1,17 +1,28 @@
 """Input processing module for math solver AI"""
+import importlib
 
-from .unified_formatter import UniversalMathInputProcessor
-from .latex_parser import LaTeXParser
-from .ocr_parser import OCRParser
-from .speech_processor import SpeechProcessor
-from .pdf_processor import PDFProcessor
-from .text_cleaner import TextCleaner
+# Submodule of each public name. They are imported on first access so that
+# plain-text workers never load OCR, PDF or speech dependencies.
+_EXPORTS = {
+    'UniversalMathInputProcessor': '.unified_formatter',
+    'LaTeXParser': '.latex_parser',
+    'OCRParser': '.ocr_parser',
+    'OCRService': '.ocr_service',
+    'SpeechProcessor': '.speech_processor',
+    'PDFProcessor': '.pdf_processor',
+    'TextCleaner': '.text_cleaner',
+}
 
-__all__ = [
-    'UniversalMathInputProcessor',
-    'LaTeXParser',
-    'OCRParser',
-    'SpeechProcessor',
-    'PDFProcessor',
-    'TextCleaner',
-]
\ No newline at end of file
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value  # Later lookups skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,23 +1,20 @@
 """LaTeX parsing and conversion utilities"""
+from src.input_processing.normalizer import Normalizer, LATEX_COMMANDS
+
 class LaTeXParser:
     """Converts LaTeX mathematical notation to plain text"""
     
     def __init__(self):
-        self.latex_mappings = {
-            '\\int': 'integrate',
-            '\\sum': 'sum',
-            '\\prod': 'product',
-            '\\partial': 'partial',
-            '\\sqrt': 'sqrt',
-            # Add more mappings
-        }
+        self.latex_mappings = dict(LATEX_COMMANDS)
+        self.normalizer = Normalizer(self.latex_mappings, whole_words=True)
     
     def parse_latex(self, text):
         """Convert LaTeX symbols to plain math"""
-        text = text.replace('\\int', 'integrate')
-        text = text.replace('\\frac{a}{b}', '(a)/(b)')
-        text = text.replace('\\sum', 'sum')
-        return text
+        return self.normalizer.normalize(text)
+    
+    def parse_latex_batch(self, texts):
+        """parse_latex() for many strings in one pass"""
+        return self.normalizer.normalize_batch(texts)
     
     def extract_latex_blocks(self, text):
         """Extract LaTeX from $ $ or $$ $$ delimiters"""
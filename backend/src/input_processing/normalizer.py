@@ -0,0 +1,90 @@
+"""Text normalization from mapping tables"""
+import re
+from typing import Dict, List
+
+# LaTeX commands -> plain math (LaTeXParser)
+LATEX_COMMANDS = {
+    '\\int': 'integrate',
+    '\\sum': 'sum',
+    '\\prod': 'product',
+    '\\partial': 'partial',
+    '\\sqrt': 'sqrt',
+    '\\frac{a}{b}': '(a)/(b)',
+}
+
+# Spoken phrases -> math notation (SpeechProcessor)
+SPOKEN_MATH = {
+    'squared': '^2',
+    'cubed': '^3',
+    'integral of': 'integrate(',
+    'from': ',',
+    'to': ',',
+    'plus': '+',
+    'minus': '-',
+    'times': '*',
+    'divided by': '/',
+}
+
+# Unicode math symbols -> ASCII (TextCleaner)
+UNICODE_SYMBOLS = {
+    '∫': 'integrate',
+    '∂': 'partial',
+    '∑': 'sum',
+    '√': 'sqrt',
+    '²': '^2',
+    '³': '^3',
+    '×': '*',
+    '÷': '/',
+    'π': 'pi',
+    '∞': 'infinity',
+}
+
+_LETTER = '[^\\W\\d_]'
+
+
+class Normalizer:
+    """Replaces the keys of a mapping table, one str.replace pass per key.
+    
+    With `whole_words`, keys that start or end with a letter only match when
+    no letter adjoins them ("to" is not replaced inside "tomato"); those keys
+    use a precompiled regex, run only when the key occurs in the text.
+    """
+    
+    def __init__(self, mappings: Dict[str, str], whole_words: bool = False):
+        self.mappings = dict(mappings)
+        self.whole_words = whole_words
+        # (key, value, pattern); pattern is None where a plain replace is exact
+        self.steps = []
+        for key, value in self.mappings.items():
+            pattern = self._boundary_pattern(key)
+            # re.sub reads backslashes in the replacement as escapes
+            self.steps.append((key, value if pattern is None else value.replace('\\', '\\\\'), pattern))
+    
+    def normalize(self, text: str) -> str:
+        for key, value, pattern in self.steps:
+            if pattern is None:
+                text = text.replace(key, value)
+            elif key in text:
+                text = pattern.sub(value, text)
+        return text
+    
+    def normalize_batch(self, texts: List[str], separator: str = '\x00') -> List[str]:
+        """Normalize many strings with one pass per key over their concatenation"""
+        if not texts:
+            return []
+        if any(separator in text for text in texts):
+            return [self.normalize(text) for text in texts]
+        # No key contains the separator, so no match can span two texts
+        return self.normalize(separator.join(texts)).split(separator)
+    
+    def _boundary_pattern(self, key: str):
+        if not (self.whole_words and key and (key[0].isalpha() or key[-1].isalpha())):
+            return None
+        pattern = re.escape(key)
+        if key[0].isalpha():
+            # Checked after the first letter, so the pattern still starts with
+            # a literal and re can skip ahead to candidate positions
+            pattern = key[0] + f'(?<!{_LETTER}{key[0]})' + re.escape(key[1:])
+        if key[-1].isalpha():
+            pattern += f'(?!{_LETTER})'
+        return re.compile(pattern)
@@ -1,6 +1,13 @@
 """OCR processing for mathematical images"""
+import os
 import pytesseract
-from PIL import Image, ImageEnhance
+from PIL import Image
+from .ocr_service import OCRService, load_image, preprocess
+
+def ocr_image(img, config: str) -> str:
+    """OCR one image directly with the math preprocessing (grayscale, contrast, binarization)"""
+    binary = preprocess(load_image(img))
+    return pytesseract.image_to_string(Image.fromarray(binary), config=config)
 
 class OCRParser:
     """Optical Character Recognition for math notation"""
@@ -8,20 +15,16 @@ class OCRParser:
     def __init__(self):
         pytesseract.pytesseract.tesseract_cmd = r'C:\Users\mappr\AppData\Local\Programs\Tesseract-OCR\tesseract.exe'
         self.config = r'--oem 3 --psm 6'
+        # Shared workers batch concurrent requests and cache repeated images
+        self.service = OCRService(
+            config=self.config,
+            workers=int(os.getenv('OCR_WORKERS', '2'))
+        )
     
     def ocr_math_advanced(self, image):
         """Better OCR specifically for mathematical notation"""
-        img = Image.open(image)
-        
-        # Preprocessing for better accuracy
-        img = img.convert('L')  # Convert to grayscale
-        enhancer = ImageEnhance.Contrast(img)
-        img = enhancer.enhance(2)  # Increase contrast
-        
-        # Use special config for math symbols
-        text = pytesseract.image_to_string(img, config=self.config)
-        
-        return text
+        # Preprocessing, caching and the math config are handled by the service
+        return self.service.recognize(image)["text"]
     
     def recognize_handwriting(self, image):
         """Specialized handwriting recognition"""
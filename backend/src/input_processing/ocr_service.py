@@ -0,0 +1,248 @@
+"""Batched OCR service: NumPy preprocessing, pooled tesseract workers and a result cache"""
+import hashlib
+import os
+import queue
+import shlex
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pytesseract
+from PIL import Image
+
+from src.tools.tool_cache import ToolCache, MemoryCacheBackend, DiskCacheBackend
+
+# ITU-R 601 luma weights, as used by PIL's convert('L')
+_LUMA = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def load_image(image) -> np.ndarray:
+    """Decode a path, file object, PIL image or array into an RGB/grayscale array"""
+    if isinstance(image, np.ndarray):
+        return image
+    if isinstance(image, Image.Image):
+        return _to_array(image)
+    # Opened here, so closed here; the array is a copy of the decoded pixels
+    with Image.open(image) as img:
+        return _to_array(img)
+
+
+def _to_array(img: Image.Image) -> np.ndarray:
+    if img.mode not in ("L", "RGB"):
+        img = img.convert("RGB")
+    return np.asarray(img)
+
+
+def preprocess(pixels: np.ndarray, contrast: float = 2.0) -> np.ndarray:
+    """Grayscale, contrast boost and Otsu binarization in a few array passes.
+    
+    Returns a uint8 image that is 0 (ink) or 255 (paper).
+    """
+    gray = pixels.astype(np.float32)
+    if gray.ndim == 3:
+        gray = gray[..., :3] @ _LUMA
+    # Same blend as PIL's ImageEnhance.Contrast: push pixels away from the mean
+    mean = gray.mean()
+    gray = np.clip(mean + contrast * (gray - mean), 0, 255).astype(np.uint8)
+    
+    # Otsu: the threshold that maximizes the between-class variance
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    weight_below = np.cumsum(hist)
+    weight_above = weight_below[-1] - weight_below
+    mass_below = np.cumsum(hist * np.arange(256))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between = (mass_below[-1] * weight_below - mass_below * weight_below[-1]) ** 2 / (weight_below * weight_above)
+    threshold = int(np.nanargmax(between)) if np.isfinite(between).any() else 127
+    return np.where(gray > threshold, 255, 0).astype(np.uint8)
+
+
+class _Job:
+    def __init__(self, pixels: np.ndarray, key: str):
+        self.pixels = pixels
+        self.key = key
+        self.future: Future = Future()
+        self.submitted_at = time.perf_counter()
+
+
+class OCRService:
+    """Runs OCR for all callers on a few long-lived worker threads.
+    
+    Images are preprocessed on the caller's thread, looked up in the cache
+    by a hash of their binarized pixels (so re-encoded uploads of the same
+    screenshot still hit), and otherwise queued. Each worker drains up to
+    `max_batch_size` queued images and recognizes them with one tesseract
+    run over an image list, instead of one process per image.
+    """
+    
+    def __init__(
+        self,
+        config: str = r'--oem 3 --psm 6',
+        workers: int = 2,
+        max_batch_size: int = 8,
+        batch_wait_ms: float = 10.0,
+        timeout_seconds: float = 30.0,
+        cache_entries: int = 512,
+        cache_path: Optional[str] = None
+    ):
+        self.config = config
+        self.max_batch_size = max_batch_size
+        self.batch_wait_seconds = batch_wait_ms / 1000
+        self.timeout_seconds = timeout_seconds
+        
+        cache_path = cache_path or os.getenv('OCR_CACHE_PATH')
+        backends = [MemoryCacheBackend(max_entries=cache_entries)]
+        if cache_path:
+            backends.append(DiskCacheBackend(cache_path))
+        self.cache = ToolCache(backends)
+        
+        self._jobs: "queue.Queue[Optional[_Job]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self.images = 0
+        self.batches = 0
+        self.total_seconds = 0.0
+        self._workers = [
+            threading.Thread(target=self._worker, name=f"ocr-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+    
+    def recognize(self, image) -> Dict[str, Any]:
+        """OCR one image; returns text, cache status and latency"""
+        return self.recognize_many([image])[0]
+    
+    def recognize_many(self, images: List) -> List[Dict[str, Any]]:
+        """OCR several images; they are queued together so they share batches"""
+        started = time.perf_counter()
+        pending = []
+        results: List[Optional[Dict[str, Any]]] = [None] * len(images)
+        for index, image in enumerate(images):
+            pixels = preprocess(load_image(image))
+            key = self._key(pixels)
+            cached = self.cache.get("ocr", key)
+            if cached is not None:
+                results[index] = {
+                    "text": cached["text"],
+                    "cached": True,
+                    "seconds": round(time.perf_counter() - started, 4)
+                }
+                continue
+            job = _Job(pixels, key)
+            self._jobs.put(job)
+            pending.append((index, job))
+        
+        for index, job in pending:
+            text = job.future.result()
+            seconds = time.perf_counter() - started
+            results[index] = {"text": text, "cached": False, "seconds": round(seconds, 4)}
+            with self._lock:
+                self.images += 1
+                self.total_seconds += seconds
+        return results
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": len(self._workers),
+                "queued": self._jobs.qsize(),
+                "images": self.images,
+                "batches": self.batches,
+                "avg_images_per_batch": round(self.images / self.batches, 2) if self.batches else 0.0,
+                "avg_seconds": round(self.total_seconds / self.images, 4) if self.images else 0.0,
+                "cache": self.cache.stats().get("ocr", {"hits": 0, "misses": 0}),
+            }
+    
+    def close(self):
+        for _ in self._workers:
+            self._jobs.put(None)
+    
+    def _worker(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            batch = [job]
+            deadline = time.perf_counter() + self.batch_wait_seconds
+            while len(batch) < self.max_batch_size:
+                try:
+                    job = self._jobs.get(timeout=max(0.0, deadline - time.perf_counter()))
+                except queue.Empty:
+                    break
+                if job is None:
+                    self._jobs.put(None)  # Leave the stop signal for this worker's next loop
+                    break
+                batch.append(job)
+            self._run_batch(batch)
+    
+    def _run_batch(self, batch: List[_Job]):
+        # The same image queued twice is recognized once
+        unique: Dict[str, np.ndarray] = {}
+        for job in batch:
+            unique.setdefault(job.key, job.pixels)
+        try:
+            texts = dict(zip(unique, self._tesseract(list(unique.values()))))
+        except Exception as e:
+            if len(unique) == 1:
+                texts = {key: e for key in unique}
+            else:
+                # Batched jobs come from unrelated uploads: retry each image
+                # alone so only the one that fails gets the error
+                texts = {}
+                for key, pixels in unique.items():
+                    try:
+                        texts[key] = self._tesseract([pixels])[0]
+                    except Exception as image_error:
+                        texts[key] = image_error
+        
+        with self._lock:
+            self.batches += 1
+        for key, text in texts.items():
+            if not isinstance(text, Exception):
+                self.cache.set(key, {"text": text})
+        for job in batch:
+            text = texts[job.key]
+            if isinstance(text, Exception):
+                job.future.set_exception(text)
+            else:
+                job.future.set_result(text)
+    
+    def _tesseract(self, images: List[np.ndarray]) -> List[str]:
+        """One tesseract process for the whole batch; pages come back separated by form feeds"""
+        with tempfile.TemporaryDirectory(prefix="ocr-") as directory:
+            paths = []
+            for i, pixels in enumerate(images):
+                path = os.path.join(directory, f"{i}.png")
+                Image.fromarray(pixels).save(path, compress_level=1)
+                paths.append(path)
+            if len(paths) == 1:
+                source = paths[0]
+            else:
+                source = os.path.join(directory, "images.txt")
+                with open(source, "w") as listing:
+                    listing.write("\n".join(paths) + "\n")
+            
+            command = [pytesseract.pytesseract.tesseract_cmd, source, "stdout", *shlex.split(self.config)]
+            completed = subprocess.run(
+                command,
+                capture_output=True,
+                timeout=self.timeout_seconds * len(images)
+            )
+        if completed.returncode != 0:
+            raise RuntimeError(f"tesseract failed: {completed.stderr.decode(errors='replace').strip()}")
+        
+        output = completed.stdout.decode(errors="replace")
+        pages = output.split("\f")
+        if len(images) == 1:
+            return [pages[0]]
+        if len(pages) < len(images):
+            raise RuntimeError(f"tesseract returned {len(pages)} pages for {len(images)} images")
+        return pages[:len(images)]
+    
+    def _key(self, pixels: np.ndarray) -> str:
+        digest = hashlib.sha256(pixels.tobytes())
+        digest.update(f"{pixels.shape}:{self.config}".encode())
+        return f"ocr:{digest.hexdigest()}"
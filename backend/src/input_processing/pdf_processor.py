@@ -1,28 +1,186 @@
 """PDF extraction and processing"""
+import hashlib
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterator, Optional
+
 import PyPDF2
+import pytesseract
 from pdf2image import convert_from_path
 
+from src.input_processing.ocr_parser import ocr_image
+from src.tools.sandbox import _set_memory_limit
+from src.tools.tool_cache import ToolCache, MemoryCacheBackend, DiskCacheBackend
+
+
+def _init_ocr_worker(memory_limit_mb: int, tesseract_cmd: str):
+    # The ceiling is inherited by the poppler and tesseract subprocesses
+    _set_memory_limit(memory_limit_mb)
+    pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+
+
+def _ocr_page(pdf_path: str, page_number: int, dpi: int, config: str) -> str:
+    """Rasterize one page and OCR it; only this page is ever in memory"""
+    images = convert_from_path(
+        pdf_path,
+        dpi=dpi,
+        first_page=page_number,
+        last_page=page_number,
+        grayscale=True
+    )
+    try:
+        return ocr_image(images[0], config)
+    finally:
+        for image in images:
+            image.close()
+
+
 class PDFProcessor:
     """Extract math problems from PDF documents"""
     
-    def __init__(self, ocr_parser=None):
+    def __init__(
+        self,
+        ocr_parser=None,
+        dpi: int = 200,
+        max_page_pixels: int = 3000,
+        min_text_chars: int = 20,
+        ocr_workers: int = None,
+        memory_limit_mb: int = None,
+        cache_path: Optional[str] = None
+    ):
         self.ocr_parser = ocr_parser
+        self.dpi = dpi
+        self.max_page_pixels = max_page_pixels  # Longest page side after rasterizing
+        self.min_text_chars = min_text_chars    # Pages with less extractable text are OCRed
+        self.ocr_workers = ocr_workers or int(os.getenv('PDF_OCR_WORKERS', '2'))
+        self.memory_limit_mb = memory_limit_mb or int(os.getenv('PDF_OCR_MEMORY_MB', '1024'))
+        self._pool: Optional[ProcessPoolExecutor] = None
+        
+        # Page texts keyed by file content, so renamed or re-uploaded files hit too
+        cache_path = cache_path or os.getenv('PDF_CACHE_PATH')
+        backends = [MemoryCacheBackend(max_entries=1024)]
+        if cache_path:
+            backends.append(DiskCacheBackend(cache_path))
+        self.cache = ToolCache(backends)
     
     def process_pdf(self, pdf_path):
         """Extract math problems from PDF"""
+        return "\n".join(page["text"] for page in self.iter_pages(pdf_path) if page["text"])
+    
+    def iter_pages(self, pdf_path: str) -> Iterator[Dict]:
+        """Yield each page's text in order as soon as it is available.
+        
+        Pages with selectable text are extracted directly (Method 1); the
+        others are rasterized one at a time and OCRed in the worker pool
+        (Method 2), with a bounded number of pages in flight.
+        """
+        file_hash = self._file_hash(pdf_path)
+        # OCR output depends on the tesseract config as well as the page
+        config = self.ocr_parser.config if self.ocr_parser else ""
+        config_hash = hashlib.sha256(config.encode()).hexdigest()[:12]
+        in_flight = deque()
+        max_in_flight = self.ocr_workers * 2
         
-        # Method 1: Extract text directly (if PDF has selectable text)
         with open(pdf_path, 'rb') as file:
             reader = PyPDF2.PdfReader(file)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text()
-        
-        # Method 2: Convert to images and OCR (if scanned PDF)
-        if not text.strip() and self.ocr_parser:
-            images = convert_from_path(pdf_path)
-            text = ""
-            for img in images:
-                text += self.ocr_parser.ocr_math_advanced(img)
+            for index, page in enumerate(reader.pages):
+                page_number = index + 1
+                dpi = self._page_dpi(page)  # What the page is actually rasterized at
+                key = f"pdf:{file_hash}:{page_number}:{dpi}:{config_hash}"
+                started = time.perf_counter()
+                
+                cached = self.cache.get("pdf_pages", key)
+                if cached is not None:
+                    in_flight.append({**cached, "cached": True, "seconds": 0.0})
+                else:
+                    # Method 1: Extract text directly (if the page has selectable text)
+                    text = page.extract_text() or ""
+                    has_text = len(text.strip()) >= self.min_text_chars
+                    if has_text or not self.ocr_parser:
+                        entry = {"page": page_number, "text": text, "method": "text"}
+                        if has_text:
+                            # Short text from a scanned page is not cached, so a
+                            # processor with OCR does not get it back later
+                            self.cache.set(key, entry)
+                        in_flight.append({
+                            **entry,
+                            "cached": False,
+                            "seconds": round(time.perf_counter() - started, 3)
+                        })
+                    else:
+                        # Method 2: OCR the scanned page in a worker process
+                        future = self._get_pool().submit(
+                            _ocr_page, pdf_path, page_number, dpi, config
+                        )
+                        in_flight.append((page_number, key, started, future))
+                
+                # Keep order: a finished page waits for the OCR pages before it
+                while in_flight and (isinstance(in_flight[0], dict) or len(in_flight) > max_in_flight):
+                    yield self._collect(in_flight.popleft())
+            
+            while in_flight:
+                yield self._collect(in_flight.popleft())
+    
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+    
+    def _collect(self, entry) -> Dict:
+        """Wait for an OCR page if needed and return its result dict"""
+        if isinstance(entry, dict):
+            return entry
+        page_number, key, started, future = entry
+        try:
+            text = future.result()
+        except MemoryError:
+            return self._failed(page_number, started, "OCR worker exceeded its memory limit")
+        except BrokenProcessPool:
+            # A worker was killed (e.g. by the kernel); start over for later pages
+            self.close()
+            return self._failed(page_number, started, "OCR worker was killed")
+        except Exception as e:
+            return self._failed(page_number, started, f"OCR failed: {e}")
         
-        return text
\ No newline at end of file
+        result = {"page": page_number, "text": text, "method": "ocr"}
+        self.cache.set(key, result)
+        return {**result, "cached": False, "seconds": round(time.perf_counter() - started, 3)}
+    
+    def _failed(self, page_number: int, started: float, error: str) -> Dict:
+        return {
+            "page": page_number,
+            "text": "",
+            "method": "ocr",
+            "error": error,
+            "cached": False,
+            "seconds": round(time.perf_counter() - started, 3)
+        }
+    
+    def _page_dpi(self, page) -> int:
+        """DPI that keeps the page's longest side within `max_page_pixels`"""
+        longest_inches = max(float(page.mediabox.width), float(page.mediabox.height)) / 72
+        if longest_inches <= 0:
+            return self.dpi
+        return max(72, min(self.dpi, int(self.max_page_pixels / longest_inches)))
+    
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.ocr_workers,
+                mp_context=multiprocessing.get_context(method),
+                initializer=_init_ocr_worker,
+                initargs=(self.memory_limit_mb, pytesseract.pytesseract.tesseract_cmd)
+            )
+        return self._pool
+    
+    def _file_hash(self, pdf_path: str) -> str:
+        digest = hashlib.sha256()
+        with open(pdf_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
\ No newline at end of file
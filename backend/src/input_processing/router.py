@@ -1,4 +1,10 @@
+import hashlib
+import json
 import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.prompts import PromptTemplate
 from langchain.chains import LLMChain
@@ -37,4 +43,139 @@ def get_router_chain():
     """
     
     prompt = PromptTemplate(template=template, input_variables=["history", "input"])
-    return LLMChain(llm=llm, prompt=prompt)
\ No newline at end of file
+    return LLMChain(llm=llm, prompt=prompt)
+
+
+GREETING_REPLY = "Hello! I am ready to help you with math."
+THANKS_REPLY = "You're welcome! Send me another math problem whenever you're ready."
+ACKNOWLEDGEMENT_REPLY = "Send me another math problem whenever you're ready."
+
+# Whole inputs that are only small talk
+GREETING_PATTERN = re.compile(
+    r"^(hi|hello|hey|hiya|yo|good (morning|afternoon|evening)|greetings)"
+    r"( there)?( math(s)? (bot|assistant))?[\s!.?,]*$",
+    re.IGNORECASE
+)
+_ACKNOWLEDGEMENT = r"(great|perfect|awesome|nice|ok(ay)?|cool|got it)"
+# Real thanks, optionally after an acknowledgement ("ok, thanks")
+THANKS_PATTERN = re.compile(
+    rf"^({_ACKNOWLEDGEMENT}[\s!.,]*)?(thanks|thank you|thx|ty|cheers)( (so|very) much)?[\s!.?,]*$",
+    re.IGNORECASE
+)
+# A bare acknowledgement is not thanks, so it gets a neutral reply
+ACKNOWLEDGEMENT_PATTERN = re.compile(rf"^{_ACKNOWLEDGEMENT}[\s!.?,]*$", re.IGNORECASE)
+
+MATH_VERB_PATTERN = re.compile(
+    r"\b(solve|simplify|factori[sz]e|factor|expand|evaluate|compute|calculate|integrate|"
+    r"differentiate|derivative|integral|limit|plot|graph|roots?|prove)\b",
+    re.IGNORECASE
+)
+# An operator between two operands, e.g. "x + 5", "2*3", "x^2", "y = 4"
+EXPRESSION_PATTERN = re.compile(r"[\w)\]]\s*(\*\*|[-+*/^=<>])\s*[\w(\[\\]")
+LATEX_PATTERN = re.compile(r"\\(frac|int|sum|sqrt|lim|prod)\b")
+# Words that point back at earlier turns and need the remote rewrite
+CONTEXT_PATTERN = re.compile(
+    r"\b(that|it|this|those|these|them|previous|above|earlier|last|same|again|instead|"
+    r"before|answer|result)\b|^\s*(and|also|then|now|so|but|what about|how about|what if)\b",
+    re.IGNORECASE
+)
+
+
+class LocalRouter:
+    """Routes obvious inputs without calling the remote router.
+
+    Greetings, thanks and acknowledgements become chat replies; math that
+    stands on its own (an expression plus a digit or a math verb, and no
+    reference to earlier turns) is routed as-is. Anything else returns None.
+    """
+
+    def __init__(self):
+        self.decisions = 0
+
+    def classify(self, history: str, user_input: str) -> Optional[Dict]:
+        text = user_input.strip()
+        if not text:
+            return None
+        if GREETING_PATTERN.match(text):
+            return self._decide("chat", GREETING_REPLY)
+        if THANKS_PATTERN.match(text):
+            return self._decide("chat", THANKS_REPLY)
+        if ACKNOWLEDGEMENT_PATTERN.match(text):
+            return self._decide("chat", ACKNOWLEDGEMENT_REPLY)
+
+        has_expression = bool(EXPRESSION_PATTERN.search(text) or LATEX_PATTERN.search(text))
+        is_math = has_expression and (
+            bool(MATH_VERB_PATTERN.search(text)) or any(char.isdigit() for char in text)
+        )
+        if not is_math:
+            return None
+        # Without history there is nothing to rewrite the problem against
+        if history.strip() and CONTEXT_PATTERN.search(text):
+            return None
+        return self._decide("math", text)
+
+    def _decide(self, kind: str, content: str) -> Dict:
+        self.decisions += 1
+        return {"type": kind, "content": content}
+
+
+class DecisionCache:
+    """LRU cache of remote router decisions keyed by (history, input)"""
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(history: str, user_input: str) -> str:
+        return hashlib.sha256(f"{history}\0{user_input.strip()}".encode()).hexdigest()
+
+    def get(self, history: str, user_input: str) -> Optional[Dict]:
+        key = self.make_key(history, user_input)
+        with self._lock:
+            decision = self._entries.get(key)
+            if decision is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(decision)
+
+    def put(self, history: str, user_input: str, decision: Dict):
+        key = self.make_key(history, user_input)
+        with self._lock:
+            self._entries[key] = dict(decision)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+def parse_router_output(decision_raw: str) -> Optional[Dict]:
+    """Parse the remote router's JSON reply; None if it is unusable"""
+    try:
+        # 1. Clean Markdown wrappers
+        clean_json = decision_raw.strip()
+        if clean_json.startswith("```json"):
+            clean_json = clean_json[7:]
+        if clean_json.endswith("```"):
+            clean_json = clean_json[:-3]
+        clean_json = clean_json.strip()
+
+        clean_json = re.sub(r'(?<!\\)\\(?![u"\\/bfnrt])', r'\\\\', clean_json)
+
+        decision = json.loads(clean_json)
+
+    except Exception as e:
+        print(f"⚠️ JSON Parse Error: {e}. Raw: {decision_raw}")
+        return None
+
+    if not isinstance(decision, dict) or "type" not in decision:
+        return None
+    return decision
@@ -1,11 +1,14 @@
 """Speech-to-math conversion"""
 import speech_recognition as sr
 
+from src.input_processing.normalizer import Normalizer, SPOKEN_MATH
+
 class SpeechProcessor:
     """Convert spoken math to text"""
     
     def __init__(self):
         self.recognizer = sr.Recognizer()
+        self.phrase_normalizer = Normalizer(SPOKEN_MATH, whole_words=True)
     
     def speech_to_math(self, audio_file):
         """Convert spoken math to text"""
@@ -21,19 +24,4 @@ class SpeechProcessor:
     
     def natural_language_to_math(self, text):
         """Convert natural language to mathematical notation"""
-        replacements = {
-            'squared': '^2',
-            'cubed': '^3',
-            'integral of': 'integrate(',
-            'from': ',',
-            'to': ',',
-            'plus': '+',
-            'minus': '-',
-            'times': '*',
-            'divided by': '/',
-        }
-        
-        for phrase, symbol in replacements.items():
-            text = text.replace(phrase, symbol)
-        
-        return text
\ No newline at end of file
+        return self.phrase_normalizer.normalize(text)
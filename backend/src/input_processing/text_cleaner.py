@@ -1,27 +1,20 @@
 """Text normalization and cleaning utilities"""
+from src.input_processing.normalizer import Normalizer, UNICODE_SYMBOLS
 
 class TextCleaner:
     """Normalize and clean mathematical text"""
     
     def __init__(self):
-        self.unicode_replacements = {
-            '∫': 'integrate',
-            '∂': 'partial',
-            '∑': 'sum',
-            '√': 'sqrt',
-            '²': '^2',
-            '³': '^3',
-            '×': '*',
-            '÷': '/',
-            'π': 'pi',
-            '∞': 'infinity',
-        }
+        self.unicode_replacements = dict(UNICODE_SYMBOLS)
+        self.normalizer = Normalizer(self.unicode_replacements)
     
     def normalize_unicode(self, text):
         """Convert Unicode math symbols to ASCII"""
-        for unicode_char, replacement in self.unicode_replacements.items():
-            text = text.replace(unicode_char, replacement)
-        return text
+        return self.normalizer.normalize(text)
+    
+    def normalize_unicode_batch(self, texts):
+        """normalize_unicode() for many strings in one pass"""
+        return self.normalizer.normalize_batch(texts)
     
     def clean_whitespace(self, text):
         """Remove extra whitespace"""
@@ -1,19 +1,60 @@
 """Universal input processor that handles all modalities"""
+import importlib
+import threading
+from typing import Callable, Dict
 from .latex_parser import LaTeXParser
-from .ocr_parser import OCRParser
-from .speech_processor import SpeechProcessor
-from .pdf_processor import PDFProcessor
 from .text_cleaner import TextCleaner
 
+# Modality handlers, built on first use: name -> factory(processor).
+# Factories import their module themselves, so heavy dependencies (tesseract,
+# PIL, PyPDF2, speech_recognition) load only when that input type shows up.
+MODALITY_PLUGINS: Dict[str, Callable] = {}
+
+def register_modality(name: str, factory: Callable):
+    """Register (or replace) the lazily built handler for a modality"""
+    MODALITY_PLUGINS[name] = factory
+
+def _import(module: str, attribute: str):
+    return getattr(importlib.import_module(module, __package__), attribute)
+
+register_modality("ocr", lambda processor: _import(".ocr_parser", "OCRParser")())
+register_modality("speech", lambda processor: _import(".speech_processor", "SpeechProcessor")())
+register_modality("pdf", lambda processor: _import(".pdf_processor", "PDFProcessor")(processor.ocr_parser))
+
 class UniversalMathInputProcessor:
     """Handles all input modalities"""
     
     def __init__(self):
         self.latex_parser = LaTeXParser()
-        self.ocr_parser = OCRParser()
-        self.speech_processor = SpeechProcessor()
-        self.pdf_processor = PDFProcessor(self.ocr_parser)
         self.text_cleaner = TextCleaner()
+        self._handlers = {}
+        self._handlers_lock = threading.RLock()
+    
+    def handler(self, name: str):
+        """The handler for a modality, importing and building it on first use"""
+        handler = self._handlers.get(name)
+        if handler is None:
+            with self._handlers_lock:
+                handler = self._handlers.get(name)
+                if handler is None:
+                    if name not in MODALITY_PLUGINS:
+                        raise ValueError(f"No handler registered for modality: {name}")
+                    print(f"🔌 Loading {name} input handler")
+                    handler = MODALITY_PLUGINS[name](self)
+                    self._handlers[name] = handler
+        return handler
+    
+    @property
+    def ocr_parser(self):
+        return self.handler("ocr")
+    
+    @property
+    def speech_processor(self):
+        return self.handler("speech")
+    
+    @property
+    def pdf_processor(self):
+        return self.handler("pdf")
     
     def process(self, input_data):
         """Universal input handler"""
@@ -40,4 +40,25 @@ def clean_latex(text: str) -> str:
     # Convert \( \) to $ $
     text = re.sub(r'\\\(', '$', text)
     text = re.sub(r'\\\)', '$', text)
-    return text
\ No newline at end of file
+    return text
+
+class LatexStreamCleaner:
+    """Applies clean_latex to text that arrives in chunks"""
+    
+    def __init__(self):
+        self.pending = ""
+    
+    def feed(self, chunk: str) -> str:
+        """Clean a chunk, holding back a trailing backslash until its partner arrives"""
+        text = self.pending + chunk
+        # Every delimiter is a backslash plus one character, so one char of lookahead suffices
+        if text.endswith("\\"):
+            self.pending, text = "\\", text[:-1]
+        else:
+            self.pending = ""
+        return clean_latex(text)
+    
+    def flush(self) -> str:
+        """Return whatever is still held back"""
+        text, self.pending = self.pending, ""
+        return clean_latex(text)
\ No newline at end of file
@@ -1,10 +1,14 @@
 """Base class for all mathematical tools"""
 from abc import ABC, abstractmethod
 from typing import Dict, Any, Optional
+from src.tools.tool_cache import CachePolicy, NO_CACHE, tool_cache
 
 class BaseTool(ABC):
     """Abstract base class for all tools"""
     
+    # Subclasses declare how their results may be cached; nothing is cached by default
+    cache_policy: CachePolicy = NO_CACHE
+    
     def __init__(self, name: str, description: str):
         self.name = name
         self.description = description
@@ -31,14 +35,25 @@ class BaseTool(ABC):
                 "tool": self.name
             }
         
+        policy = self.cache_policy
+        cache_key = None
+        if policy.enabled:
+            cache_key = policy.make_key(self.name, args, kwargs)
+            cached = tool_cache.get(self.name, cache_key, policy.ttl_seconds)
+            if cached is not None:
+                return {**cached, "cached": True}
+        
         try:
             result = self.execute(*args, **kwargs)
-            return {
+            response = {
                 "success": True,
                 "result": result,
                 "tool": self.name,
                 "formatted": self.format_result(result)
             }
+            if cache_key is not None and policy.should_store(result):
+                tool_cache.set(cache_key, response, policy.ttl_seconds)
+            return response
         except Exception as e:
             return {
                 "success": False,
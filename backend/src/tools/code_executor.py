@@ -1,28 +1,40 @@
 """Safe Python code execution"""
 from src.tools.base_tool import BaseTool
+from src.tools.tool_cache import CachePolicy
+from src.tools.sandbox import SandboxPool
 from typing import Dict, Any
-import sys
-from io import StringIO
 
 class CodeExecutor(BaseTool):
     """Execute Python code safely"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        cache_results: bool = False,
+        pool_size: int = 2,
+        timeout_seconds: float = 10.0,
+        cpu_seconds: float = 5.0,
+        memory_limit_mb: int = 1024
+    ):
         super().__init__(
             name="code_executor",
             description="Execute Python code for custom calculations"
         )
         
-        # Safe built-ins
-        self.safe_builtins = {
-            'abs': abs,
-            'max': max,
-            'min': min,
-            'sum': sum,
-            'len': len,
-            'range': range,
-            'print': print,
-        }
+        # Arbitrary code may depend on time or randomness, so caching is opt-in
+        if cache_results:
+            self.cache_policy = CachePolicy(
+                ttl_seconds=3600,
+                accept=lambda result: 'error' not in result,
+                version="2"  # Keys before v2 collapsed whitespace in `code`
+            )
+        
+        # Snippets run in warm worker processes, never in the model process
+        self.sandbox = SandboxPool(
+            size=pool_size,
+            timeout_seconds=timeout_seconds,
+            cpu_seconds=cpu_seconds,
+            memory_limit_mb=memory_limit_mb
+        )
     
     def execute(self, code: str, **kwargs) -> Dict[str, Any]:
         """
@@ -31,44 +43,7 @@ class CodeExecutor(BaseTool):
         Args:
             code: Python code to execute
         """
-        # Capture stdout
-        old_stdout = sys.stdout
-        sys.stdout = captured_output = StringIO()
-        
-        # Safe namespace
-        namespace = {
-            '__builtins__': self.safe_builtins,
-            'np': __import__('numpy'),
-            'math': __import__('math'),
-        }
-        
-        try:
-            # Execute code
-            exec(code, namespace)
-            
-            # Get output
-            output = captured_output.getvalue()
-            
-            # Get result if 'result' variable exists
-            result_value = namespace.get('result', None)
-            
-            return {
-                "code": code,
-                "output": output,
-                "result": result_value,
-                "variables": {k: str(v) for k, v in namespace.items() 
-                            if not k.startswith('_')}
-            }
-        
-        except Exception as e:
-            return {
-                "code": code,
-                "error": str(e),
-                "output": captured_output.getvalue()
-            }
-        
-        finally:
-            sys.stdout = old_stdout
+        return self.sandbox.run(code)
     
     def format_result(self, result: Dict[str, Any]) -> str:
         """Format for model injection"""
@@ -0,0 +1,177 @@
+"""Validated, compiled and cached numeric expressions"""
+import ast
+import base64
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+FUNCTIONS = {
+    'sin': np.sin,
+    'cos': np.cos,
+    'tan': np.tan,
+    'arcsin': np.arcsin,
+    'arccos': np.arccos,
+    'arctan': np.arctan,
+    'sinh': np.sinh,
+    'cosh': np.cosh,
+    'tanh': np.tanh,
+    'sqrt': np.sqrt,
+    'log': np.log,
+    'log10': np.log10,
+    'log2': np.log2,
+    'exp': np.exp,
+    'abs': np.abs,
+    'floor': np.floor,
+    'ceil': np.ceil,
+}
+CONSTANTS = {
+    'pi': np.pi,
+    'e': np.e,
+}
+# np.<name> attributes an expression may use (names missing from this NumPy are dropped)
+NUMPY_ATTRIBUTES = {name for name in set(FUNCTIONS) | set(CONSTANTS) | {
+    # Reductions and statistics
+    'sum', 'mean', 'median', 'average', 'std', 'var', 'min', 'max', 'prod', 'ptp',
+    'percentile', 'quantile', 'argmin', 'argmax', 'cumsum', 'cumprod', 'diff', 'gradient',
+    'trapezoid', 'trapz', 'count_nonzero', 'all', 'any',
+    # Elementwise
+    'round', 'minimum', 'maximum', 'clip', 'where', 'sign', 'mod', 'power', 'hypot',
+    'arctan2', 'arcsinh', 'arccosh', 'arctanh', 'log1p', 'expm1', 'degrees', 'radians',
+    'deg2rad', 'rad2deg', 'isclose', 'interp',
+    # Linear algebra and array construction
+    'dot', 'matmul', 'inner', 'outer', 'cross', 'transpose', 'trace', 'sort', 'unique',
+    'array', 'linspace', 'arange', 'zeros', 'ones', 'full', 'eye', 'diag', 'reshape',
+    'inf', 'nan',
+} if hasattr(np, name)}
+# np.linalg.<name> attributes
+LINALG_ATTRIBUTES = {
+    'norm', 'det', 'inv', 'pinv', 'solve', 'lstsq', 'eig', 'eigh', 'eigvals', 'eigvalsh',
+    'svd', 'matrix_rank', 'matrix_power', 'qr', 'cholesky', 'cond',
+}
+
+_ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Call, ast.Name, ast.Load,
+    ast.Constant, ast.Attribute, ast.Compare, ast.Tuple, ast.List, ast.keyword,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+    ast.USub, ast.UAdd,
+    ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.Eq, ast.NotEq,
+)
+
+
+class ExpressionError(ValueError):
+    """Raised for expressions that are malformed or use disallowed syntax"""
+
+
+class CompiledExpression:
+    """An expression parsed, checked and compiled once"""
+
+    def __init__(self, source: str, code, variables: List[str]):
+        self.source = source
+        self.code = code
+        self.variables = variables  # Free names other than functions/constants
+
+    def evaluate(self, values: Optional[Dict[str, Any]] = None):
+        namespace = {'np': np, **FUNCTIONS, **CONSTANTS}
+        namespace.update(values or {})
+        missing = [name for name in self.variables if name not in namespace]
+        if missing:
+            raise ExpressionError(f"No values given for: {', '.join(missing)}")
+        with np.errstate(all="ignore"):
+            return eval(self.code, {"__builtins__": {}}, namespace)
+
+
+@lru_cache(maxsize=1024)
+def compile_expression(source: str) -> CompiledExpression:
+    """Parse and validate an expression; results are cached by source text"""
+    try:
+        # Math notation: x^2 means x**2 (replaced before parsing to keep ** precedence)
+        tree = ast.parse(source.strip().replace('^', '**'), mode="eval")
+    except SyntaxError as e:
+        raise ExpressionError(f"Invalid expression: {e.msg}") from None
+
+    variables = []
+    nodes = list(ast.walk(tree))
+    # np.linalg is only allowed as the start of np.linalg.<name>
+    linalg_chains = {
+        id(node.value) for node in nodes
+        if isinstance(node, ast.Attribute) and node.attr in LINALG_ATTRIBUTES
+    }
+    for node in nodes:
+        if not isinstance(node, _ALLOWED_NODES):
+            raise ExpressionError(f"Unsupported syntax: {type(node).__name__}")
+        if isinstance(node, ast.Attribute):
+            if not _allowed_attribute(node, linalg_chains):
+                raise ExpressionError(f"Unsupported attribute: {ast.unparse(node)}")
+        elif isinstance(node, ast.keyword):
+            if node.arg is None:
+                raise ExpressionError(f"Unsupported call: **{ast.unparse(node.value)}")
+        elif isinstance(node, ast.Call):
+            if not isinstance(node.func, (ast.Name, ast.Attribute)):
+                raise ExpressionError(f"Unsupported call: {ast.unparse(node)}")
+            if isinstance(node.func, ast.Name) and node.func.id not in FUNCTIONS:
+                raise ExpressionError(f"Unknown function: {node.func.id}")
+        elif isinstance(node, ast.Name):
+            if node.id.startswith('_'):
+                raise ExpressionError(f"Invalid name: {node.id}")
+            known = node.id == 'np' or node.id in FUNCTIONS or node.id in CONSTANTS
+            if not known and node.id not in variables:
+                variables.append(node.id)
+
+    return CompiledExpression(source, compile(tree, "<expression>", "eval"), variables)
+
+
+def _allowed_attribute(node: ast.Attribute, linalg_chains) -> bool:
+    """np.<name> from NUMPY_ATTRIBUTES, or np.linalg.<name> from LINALG_ATTRIBUTES"""
+    if isinstance(node.value, ast.Name):
+        if node.value.id != 'np':
+            return False
+        return node.attr in NUMPY_ATTRIBUTES or (node.attr == 'linalg' and id(node) in linalg_chains)
+    return (
+        isinstance(node.value, ast.Attribute)
+        and ast.unparse(node.value) == 'np.linalg'
+        and node.attr in LINALG_ATTRIBUTES
+    )
+
+
+def sweep(
+    expressions: List[str],
+    variables: Optional[Dict[str, Any]] = None,
+    grid: bool = False
+) -> List[np.ndarray]:
+    """Evaluate every expression over the given parameter arrays in one pass each.
+
+    Parameter arrays broadcast against each other; with `grid`, every
+    combination of the parameters is evaluated (outer product).
+    """
+    values = {name: np.asarray(value, dtype=float) for name, value in (variables or {}).items()}
+    if grid and values:
+        names = list(values)
+        meshes = np.meshgrid(*(values[name].ravel() for name in names), indexing="ij")
+        values = dict(zip(names, meshes))
+    shape = np.broadcast_shapes(*(value.shape for value in values.values())) if values else ()
+    results = []
+    for source in expressions:
+        result = np.asarray(compile_expression(source).evaluate(values))
+        if result.shape != shape and result.size == 1:
+            result = np.broadcast_to(result, shape)  # Expressions without the variables
+        results.append(result)
+    return results
+
+
+def encode_array(array: np.ndarray) -> Dict[str, Any]:
+    """Compact binary form: base64 of the raw little-endian buffer"""
+    array = np.ascontiguousarray(array)
+    if array.dtype.kind == 'b':
+        array = array.astype(np.uint8)
+    dtype = array.dtype.newbyteorder('<')
+    return {
+        "dtype": dtype.str,
+        "shape": list(array.shape),
+        "data": base64.b64encode(array.astype(dtype, copy=False).tobytes()).decode(),
+    }
+
+
+def decode_array(encoded: Dict[str, Any]) -> np.ndarray:
+    buffer = base64.b64decode(encoded["data"])
+    return np.frombuffer(buffer, dtype=np.dtype(encoded["dtype"])).reshape(encoded["shape"])
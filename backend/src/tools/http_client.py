@@ -0,0 +1,170 @@
+"""Pooled HTTP client with retries, bounded concurrency, caching and a circuit breaker"""
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from src.tools.tool_cache import ToolCache, tool_cache
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an API that has been failing"""
+
+
+class HttpStatusError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"API request failed with status {status_code}")
+        self.status_code = status_code
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures.
+
+    While open, calls are refused; after `reset_seconds` one trial call is
+    let through, and its outcome closes or reopens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = "half_open"
+                self._trial_running = False
+            if self.state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    print(f"🔌 Circuit opened after {self.failures} failures")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+
+class PooledHttpClient:
+    """Keep-alive session shared by all calls to one API.
+
+    GETs are retried with exponential backoff on connection errors and
+    429/5xx responses, at most `max_concurrency` run at once, successful
+    JSON responses are cached with a TTL and repeated failures trip a
+    circuit breaker.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        timeout: float = 15.0,
+        max_concurrency: int = 4,
+        retries: int = 2,
+        backoff_seconds: float = 0.5,
+        cache: Optional[ToolCache] = None,
+        cache_ttl_seconds: Optional[float] = 7 * 24 * 3600,
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        self.name = name
+        self.timeout = timeout
+        self.cache = cache if cache is not None else tool_cache
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_seconds,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(["GET"]),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+        self.rejected = 0
+
+    def get_json(
+        self,
+        url: str,
+        params: Dict[str, Any],
+        cache_params: Optional[Dict[str, Any]] = None,
+        cacheable: Optional[Callable[[Any], bool]] = None
+    ) -> Any:
+        """GET `url` and return the decoded JSON body.
+
+        `cache_params` (defaults to `params`) keys the cache, so secrets such
+        as API keys can be left out; `cacheable` decides which bodies to keep.
+        """
+        key = self._cache_key(url, cache_params if cache_params is not None else params)
+        cached = self.cache.get(self.name, key, self.cache_ttl_seconds)
+        if cached is not None:
+            return cached["body"]
+
+        if not self.breaker.allow():
+            self._count("rejected")
+            raise CircuitOpenError(f"{self.name} is failing; calls are paused for {self.breaker.reset_seconds}s")
+
+        try:
+            with self._slots:
+                self._count("requests")
+                response = self.session.get(url, params=params, timeout=self.timeout)
+            if response.status_code != 200:
+                raise HttpStatusError(response.status_code)
+            body = response.json()
+        except Exception:
+            self._count("failures")
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+
+        if cacheable is None or cacheable(body):
+            self.cache.set(key, {"body": body}, self.cache_ttl_seconds)
+        return body
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "failures": self.failures,
+                "rejected": self.rejected,
+                "circuit": self.breaker.state,
+            }
+
+    def close(self):
+        self.session.close()
+
+    def _cache_key(self, url: str, params: Dict[str, Any]) -> str:
+        payload = json.dumps([url, params], sort_keys=True, default=str)
+        return f"{self.name}:{hashlib.sha256(payload.encode()).hexdigest()}"
+
+    def _count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
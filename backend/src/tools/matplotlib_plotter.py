@@ -1,25 +1,47 @@
 """Matplotlib plotting tool"""
-import matplotlib.pyplot as plt
 import numpy as np
-import io
 import base64
 from src.tools.base_tool import BaseTool
+from src.tools.tool_cache import CachePolicy, compact_expression
+from src.tools.plot_renderer import PlotRenderer
+from src.tools.expression_engine import compile_expression
 from typing import Dict, Any
 
+DEFAULT_OPTIONS = {
+    "x_range": [-10, 10],
+    "plot_type": "line",
+    "width": 800,
+    "height": 480,
+    "format": "png",
+}
+
+def _render_key(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Render cache key: (function, x_range, plot_type, size, format) with defaults filled in"""
+    params = compact_expression({**DEFAULT_OPTIONS, **params}, "function")
+    params["x_range"] = [float(bound) for bound in params["x_range"]]
+    return params
+
 class MatplotlibPlotter(BaseTool):
     """Create graphs and visualizations"""
     
-    def __init__(self):
+    # Rendered images are large, so they expire after a day
+    cache_policy = CachePolicy(ttl_seconds=24 * 3600, normalize=_render_key)
+    
+    def __init__(self, render_workers: int = 2):
         super().__init__(
             name="matplotlib_plotter",
             description="Generate graphs: functions, scatter plots, histograms"
         )
+        self.renderer = PlotRenderer(max_workers=render_workers, pool_size=render_workers * 2)
     
     def execute(
         self,
         function: str,
         x_range: tuple = (-10, 10),
         plot_type: str = "line",
+        width: int = 800,
+        height: int = 480,
+        format: str = "png",
         **kwargs
     ) -> Dict[str, Any]:
         """
@@ -28,51 +50,31 @@ class MatplotlibPlotter(BaseTool):
         Args:
             function: Function to plot (e.g., "x**2", "np.sin(x)")
             x_range: Range for x-axis
-            plot_type: 'line', 'scatter', 'bar'
+            plot_type: 'line', 'scatter'
+            width, height: Image size in pixels
+            format: 'png', 'webp' or 'svg'
         """
-        # Generate x values
-        x = np.linspace(x_range[0], x_range[1], 500)
-        
-        # Evaluate function
-        safe_namespace = {
-            'x': x,
-            'np': np,
-            'sin': np.sin,
-            'cos': np.cos,
-            'sqrt': np.sqrt,
-            'exp': np.exp,
-            'log': np.log,
-        }
-        
-        y = eval(function, {"__builtins__": {}}, safe_namespace)
+        # Parsed and validated once; evaluated on whole sample arrays
+        expression = compile_expression(function)
+        f = lambda x: expression.evaluate({'x': x})
         
-        # Create plot
-        plt.figure(figsize=(10, 6))
-        
-        if plot_type == "line":
-            plt.plot(x, y, linewidth=2)
-        elif plot_type == "scatter":
-            plt.scatter(x, y)
-        
-        plt.xlabel('x', fontsize=12)
-        plt.ylabel('y', fontsize=12)
-        plt.title(f'Plot of {function}', fontsize=14)
-        plt.grid(True, alpha=0.3)
-        
-        # Save to buffer
-        buffer = io.BytesIO()
-        plt.savefig(buffer, format='png', dpi=150, bbox_inches='tight')
-        buffer.seek(0)
-        
-        # Encode to base64
-        image_base64 = base64.b64encode(buffer.read()).decode()
-        plt.close()
+        image = self.renderer.render(
+            f=f,
+            label=function,
+            x_range=x_range,
+            plot_type=plot_type,
+            width=int(width),
+            height=int(height),
+            format=format
+        )
         
         return {
             "function": function,
             "x_range": x_range,
-            "image_base64": image_base64,
-            "plot_type": plot_type
+            "image_base64": base64.b64encode(image["data"]).decode(),
+            "mime_type": image["mime_type"],
+            "plot_type": plot_type,
+            "points": image["points"]
         }
     
     def format_result(self, result: Dict[str, Any]) -> str:
@@ -1,50 +1,76 @@
 """NumPy-based numerical calculator"""
 import numpy as np
 from src.tools.base_tool import BaseTool
-from typing import Dict, Any
+from src.tools.tool_cache import CachePolicy, compact_expression
+from src.tools.expression_engine import sweep, encode_array
+from typing import Dict, Any, List, Optional
 
 class NumpyCalculator(BaseTool):
     """Numerical computations using NumPy"""
     
+    cache_policy = CachePolicy(normalize=lambda params: compact_expression(params, "expression"))
+    
     def __init__(self):
         super().__init__(
             name="numpy_calculator",
-            description="Numerical calculations: arithmetic, trigonometry, statistics"
+            description="Numerical calculations: arithmetic, trigonometry, statistics, tables of values and parameter sweeps"
         )
-        
-        # Safe namespace for eval
-        self.safe_namespace = {
-            'np': np,
-            'sin': np.sin,
-            'cos': np.cos,
-            'tan': np.tan,
-            'sqrt': np.sqrt,
-            'log': np.log,
-            'exp': np.exp,
-            'abs': np.abs,
-            'pi': np.pi,
-            'e': np.e,
-        }
     
-    def execute(self, expression: str, **kwargs) -> Dict[str, Any]:
+    def execute(
+        self,
+        expression: str = None,
+        expressions: Optional[List[str]] = None,
+        variables: Optional[Dict[str, Any]] = None,
+        grid: bool = False,
+        **kwargs
+    ) -> Dict[str, Any]:
         """
-        Evaluate numerical expression
+        Evaluate numerical expression(s)
         
         Args:
             expression: Mathematical expression
+            expressions: Several expressions evaluated over the same variables
+            variables: Parameter values, e.g. {"x": [0, 1, 2]}; arrays broadcast together
+            grid: Evaluate every combination of the variable values
         """
-        # Replace common notations
-        expression = expression.replace('^', '**')
-        
-        # Evaluate safely
-        result = eval(expression, {"__builtins__": {}}, self.safe_namespace)
+        if expressions is None:
+            if expression is None:
+                raise ValueError("Provide an expression or a list of expressions")
+            result = self._describe(expression, sweep([expression], variables, grid)[0])
+            if variables:
+                result["variables"] = {name: np.asarray(value).tolist() for name, value in variables.items()}
+            return result
         
+        # Each expression is one vectorized evaluation over all parameter values
+        values = sweep(expressions, variables, grid)
+        return {
+            "variables": {name: np.asarray(value).tolist() for name, value in (variables or {}).items()},
+            "grid": grid,
+            "results": [self._describe(source, value) for source, value in zip(expressions, values)],
+            "type": "batch"
+        }
+    
+    def _describe(self, expression: str, value: np.ndarray) -> Dict[str, Any]:
+        """Scalars stay plain numbers; arrays are returned in binary form"""
+        if value.ndim == 0:
+            return {
+                "expression": expression,
+                "result": float(value),
+                "type": value.dtype.name
+            }
         return {
             "expression": expression,
-            "result": float(result) if np.isscalar(result) else result.tolist(),
-            "type": type(result).__name__
+            "result": encode_array(value),
+            "type": "ndarray",
+            "preview": np.array2string(value, precision=6, threshold=50)
         }
     
     def format_result(self, result: Dict[str, Any]) -> str:
         """Format for model injection"""
+        if result["type"] == "batch":
+            lines = [f"{name} = {values}" for name, values in result["variables"].items()]
+            lines += [self.format_result(item) for item in result["results"]]
+            return "\n".join(lines)
+        if result["type"] == "ndarray":
+            return f"{result['expression']} = {result['preview']}"
         return f"{result['expression']} = {result['result']}"
\ No newline at end of file
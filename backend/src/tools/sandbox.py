@@ -0,0 +1,206 @@
+"""Pool of warm worker processes that run untrusted Python snippets"""
+import io
+import math
+import multiprocessing
+import pickle
+import queue
+import threading
+from contextlib import redirect_stdout
+from typing import Any, Dict
+
+try:
+    import resource  # POSIX only; limits are skipped elsewhere
+except ImportError:
+    resource = None
+
+SAFE_BUILTINS = {
+    'abs': abs,
+    'max': max,
+    'min': min,
+    'sum': sum,
+    'len': len,
+    'range': range,
+    'print': print,
+}
+
+
+def _set_memory_limit(memory_limit_mb: int):
+    if resource is None or not memory_limit_mb:
+        return
+    limit = memory_limit_mb * 1024 * 1024
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def _set_cpu_limit(cpu_seconds: float):
+    """Allow `cpu_seconds` more CPU time; the kernel kills the worker past it"""
+    if resource is None or not cpu_seconds:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    limit = int(math.ceil(usage.ru_utime + usage.ru_stime + cpu_seconds))
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (limit, hard))
+
+
+def _run_code(code: str, numpy_module) -> Dict[str, Any]:
+    """Execute one snippet with restricted builtins, capturing its stdout"""
+    captured_output = io.StringIO()
+    namespace = {
+        '__builtins__': SAFE_BUILTINS,
+        'np': numpy_module,
+        'math': math,
+    }
+
+    try:
+        with redirect_stdout(captured_output):
+            exec(code, namespace)
+
+        result_value = namespace.get('result', None)
+        try:
+            pickle.dumps(result_value)
+        except Exception:
+            result_value = str(result_value)  # Must cross the process boundary
+
+        return {
+            "code": code,
+            "output": captured_output.getvalue(),
+            "result": result_value,
+            "variables": {k: str(v) for k, v in namespace.items()
+                        if not k.startswith('_')}
+        }
+
+    except BaseException as e:
+        return {
+            "code": code,
+            "error": str(e) or type(e).__name__,
+            "output": captured_output.getvalue()
+        }
+
+
+def _worker_main(conn, memory_limit_mb: int):
+    """Worker loop: receive (code, cpu_seconds), send back the result dict"""
+    import numpy
+    _set_memory_limit(memory_limit_mb)
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        if message is None:
+            return
+        code, cpu_seconds = message
+        _set_cpu_limit(cpu_seconds)
+        conn.send(_run_code(code, numpy))
+
+
+class _Worker:
+    def __init__(self, context, memory_limit_mb: int):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(child_conn, memory_limit_mb),
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+
+    def kill(self):
+        self.conn.close()
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=1)
+
+
+class SandboxPool:
+    """Runs code in pre-started worker processes, one snippet per worker at a time.
+
+    Workers come from a fork server that has numpy and math preloaded (spawn
+    on platforms without one). Each call gets a wall-clock timeout and, on
+    POSIX, a CPU-time limit; address space is capped per worker. A worker
+    that times out or dies is killed and replaced.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        timeout_seconds: float = 10.0,
+        cpu_seconds: float = 5.0,
+        memory_limit_mb: int = 1024
+    ):
+        self.size = size
+        self.timeout_seconds = timeout_seconds
+        self.cpu_seconds = cpu_seconds
+        self.memory_limit_mb = memory_limit_mb
+
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            self._context = multiprocessing.get_context("forkserver")
+            self._context.set_forkserver_preload(["numpy", "math", __name__])
+        else:
+            self._context = multiprocessing.get_context("spawn")
+
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self.runs = 0
+        self.timeouts = 0
+        self.crashes = 0
+        for _ in range(size):
+            self._idle.put(self._spawn())
+
+    def run(self, code: str) -> Dict[str, Any]:
+        """Execute `code` in a free worker, waiting for one if all are busy"""
+        if self._closed:
+            raise RuntimeError("Sandbox pool is closed")
+        worker = self._idle.get()
+        error = None
+        try:
+            worker.conn.send((code, self.cpu_seconds))
+            if worker.conn.poll(self.timeout_seconds):
+                result = worker.conn.recv()
+                self._count("runs")
+                self._idle.put(worker)
+                return result
+            error = f"Execution timed out after {self.timeout_seconds}s"
+            self._count("timeouts")
+        except (EOFError, OSError):
+            error = "Execution aborted: CPU time or memory limit exceeded"
+            self._count("crashes")
+
+        # The worker is stuck or gone; replace it so the pool keeps its size
+        worker.kill()
+        self._idle.put(self._spawn())
+        return {"code": code, "error": error, "output": ""}
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "workers": self.size,
+                "idle": self._idle.qsize(),
+                "runs": self.runs,
+                "timeouts": self.timeouts,
+                "crashes": self.crashes,
+            }
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+            worker.kill()
+
+    def _spawn(self) -> _Worker:
+        return _Worker(self._context, self.memory_limit_mb)
+
+    def _count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
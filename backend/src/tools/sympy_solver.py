@@ -1,11 +1,17 @@
 """SymPy integration for symbolic mathematics"""
 import sympy as sp
 from src.tools.base_tool import BaseTool
+from src.tools.tool_cache import CachePolicy, compact_expression
 from typing import Dict, Any
 
 class SymPySolver(BaseTool):
     """Symbolic mathematics using SymPy"""
     
+    # Symbolic results never change, and integrals/simplify can be slow
+    cache_policy = CachePolicy(
+        normalize=lambda params: compact_expression(params, "expression", "variable")
+    )
+    
     def __init__(self):
         super().__init__(
             name="sympy_solver",
@@ -0,0 +1,208 @@
+"""Result caching for tool calls"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+
+class CachePolicy:
+    """Declares whether and how a tool's results are cached.
+
+    Args:
+        enabled: Cache this tool's results at all
+        ttl_seconds: Entry lifetime (None = until evicted)
+        normalize: Maps call params to a canonical form before keying
+        accept: Decides whether a successful result may be stored
+        version: Bump to invalidate entries written by older tool code
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        ttl_seconds: Optional[float] = None,
+        normalize: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+        accept: Optional[Callable[[Any], bool]] = None,
+        version: str = "1"
+    ):
+        self.enabled = enabled
+        self.ttl_seconds = ttl_seconds
+        self.normalize = normalize
+        self.accept = accept
+        self.version = version
+
+    def make_key(self, tool_name: str, args: tuple, kwargs: Dict[str, Any]) -> str:
+        # Params are keyed verbatim (whitespace matters in code); tools opt in via `normalize`
+        params = dict(kwargs)
+        if self.normalize is not None:
+            params = self.normalize(params)
+        payload = json.dumps(
+            [tool_name, self.version, list(args), params],
+            sort_keys=True,
+            default=str
+        )
+        return f"{tool_name}:{hashlib.sha256(payload.encode()).hexdigest()}"
+
+    def should_store(self, result: Any) -> bool:
+        return self.accept is None or self.accept(result)
+
+
+NO_CACHE = CachePolicy(enabled=False)
+
+
+def compact_expression(params: Dict[str, Any], *names: str) -> Dict[str, Any]:
+    """Drop all whitespace from expression params and spell powers as **"""
+    params = dict(params)
+    for name in names:
+        if isinstance(params.get(name), str):
+            params[name] = re.sub(r"\s+", "", params[name]).replace("^", "**")
+    return params
+
+
+class MemoryCacheBackend:
+    """Process-local LRU"""
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # Key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Dict, ttl_seconds: Optional[float] = None):
+        expires_at = time.time() + ttl_seconds if ttl_seconds else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DiskCacheBackend:
+    """sqlite store that several worker processes can share"""
+
+    def __init__(self, path: str, max_entries: int = 100_000):
+        self.path = path
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        # WAL lets other processes read while one of them writes
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS tool_results ("
+            "key TEXT PRIMARY KEY, value TEXT, expires_at REAL, created_at REAL)"
+        )
+        self._db.commit()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM tool_results WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is not None and expires_at < time.time():
+            return None
+        return json.loads(value)
+
+    def set(self, key: str, value: Dict, ttl_seconds: Optional[float] = None):
+        now = time.time()
+        expires_at = now + ttl_seconds if ttl_seconds else None
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO tool_results VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, default=str), expires_at, now)
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._prune(now)
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM tool_results")
+            self._db.commit()
+
+    def _prune(self, now: float):
+        self._db.execute("DELETE FROM tool_results WHERE expires_at < ?", (now,))
+        self._db.execute(
+            "DELETE FROM tool_results WHERE key NOT IN ("
+            "SELECT key FROM tool_results ORDER BY created_at DESC LIMIT ?)",
+            (self.max_entries,)
+        )
+
+
+class ToolCache:
+    """Looks results up through a chain of backends and counts hits per tool.
+
+    A hit in a lower tier (e.g. disk) is copied into the tiers above it.
+    """
+
+    def __init__(self, backends: Optional[List] = None):
+        self.backends = backends if backends is not None else [MemoryCacheBackend()]
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def configure(self, backends: List):
+        """Replace the backend chain (e.g. add a shared disk tier at startup)"""
+        self.backends = backends
+
+    def get(self, tool_name: str, key: str, ttl_seconds: Optional[float] = None) -> Optional[Dict]:
+        for depth, backend in enumerate(self.backends):
+            value = backend.get(key)
+            if value is not None:
+                for upper in self.backends[:depth]:
+                    upper.set(key, value, ttl_seconds)
+                self._count(tool_name, "hits")
+                return value
+        self._count(tool_name, "misses")
+        return None
+
+    def set(self, key: str, value: Dict, ttl_seconds: Optional[float] = None):
+        for backend in self.backends:
+            backend.set(key, value, ttl_seconds)
+
+    def clear(self):
+        for backend in self.backends:
+            backend.clear()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Hits, misses and hit ratio per tool"""
+        with self._lock:
+            return {
+                tool: {
+                    **counts,
+                    "hit_ratio": counts["hits"] / (counts["hits"] + counts["misses"]),
+                }
+                for tool, counts in self._stats.items()
+            }
+
+    def _count(self, tool_name: str, outcome: str):
+        with self._lock:
+            counts = self._stats.setdefault(tool_name, {"hits": 0, "misses": 0})
+            counts[outcome] += 1
+
+
+# Global cache shared by every tool
+tool_cache = ToolCache()
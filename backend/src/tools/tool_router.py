@@ -1,57 +1,82 @@
 """Routes tool calls to appropriate tools"""
+import json
 import re
-from typing import Dict, Any, Optional
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
 from src.tools.tool_registry import tool_registry
 
 class ToolRouter:
     """Routes and executes tool calls from model output"""
     
-    def __init__(self):
+    def __init__(self, max_workers: int = 4):
         self.tool_call_pattern = r'<tool_call>(.*?)</tool_call>'
+        self.tool_call_start = '<tool_call>'
+        self.tool_call_end = '</tool_call>'  # Generation stops here so the tool can run
         self.tool_name_pattern = r'tool:\s*(\w+)'
-        self.tool_params_pattern = r'params:\s*({.*?})'
+        self.tool_params_pattern = r'params:\s*(?={)'  # The object itself is read by a JSON decoder
+        self.json_decoder = json.JSONDecoder()
+        # Calls made in the same turn cannot see each other's results, so they run concurrently
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
     
     def detect_tool_call(self, text: str) -> bool:
         """Check if text contains a tool call"""
         return bool(re.search(self.tool_call_pattern, text, re.DOTALL))
     
     def parse_tool_call(self, text: str) -> Optional[Dict[str, Any]]:
-        """Parse tool call from model output"""
-        match = re.search(self.tool_call_pattern, text, re.DOTALL)
-        
-        if not match:
-            return None
-        
-        tool_call_content = match.group(1)
-        
-        # Extract tool name
-        tool_match = re.search(self.tool_name_pattern, tool_call_content)
-        if not tool_match:
-            return None
-        
-        tool_name = tool_match.group(1)
-        
-        # Extract parameters (if any)
-        params = {}
-        params_match = re.search(self.tool_params_pattern, tool_call_content)
-        if params_match:
-            import json
-            try:
-                params = json.loads(params_match.group(1))
-            except:
-                pass
+        """Parse the first tool call from model output"""
+        calls = self.parse_tool_calls(text)
+        return calls[0] if calls else None
+    
+    def parse_tool_calls(self, text: str) -> List[Dict[str, Any]]:
+        """Parse every tool call in model output, in order.
         
-        return {
-            "tool_name": tool_name,
-            "params": params,
-            "raw_call": tool_call_content
-        }
+        Calls without a tool name are skipped. Calls whose params are not a
+        valid JSON object carry an `error` and are not run.
+        """
+        calls = []
+        for match in re.finditer(self.tool_call_pattern, text, re.DOTALL):
+            tool_call_content = match.group(1)
+            
+            # Extract tool name
+            tool_match = re.search(self.tool_name_pattern, tool_call_content)
+            if not tool_match:
+                continue
+            
+            call = {
+                "tool_name": tool_match.group(1),
+                "params": {},
+                "raw_call": tool_call_content
+            }
+            
+            # Extract parameters (if any); nested objects such as `variables` are allowed
+            params_match = re.search(self.tool_params_pattern, tool_call_content)
+            if params_match:
+                try:
+                    params, _ = self.json_decoder.raw_decode(tool_call_content, params_match.end())
+                    if not isinstance(params, dict):
+                        raise ValueError("params must be a JSON object")
+                    call["params"] = params
+                except ValueError as e:
+                    call["error"] = f"Could not parse params: {e}"
+            elif re.search(r'params:', tool_call_content):
+                call["error"] = "Could not parse params: expected a JSON object"
+            
+            calls.append(call)
+        return calls
     
     def execute_tool(self, tool_call: Dict[str, Any]) -> Dict[str, Any]:
         """Execute the tool and return result"""
         tool_name = tool_call["tool_name"]
         params = tool_call["params"]
         
+        if "error" in tool_call:
+            return {
+                "success": False,
+                "error": tool_call["error"],
+                "tool": tool_name
+            }
+        
         # Get tool from registry
         tool = tool_registry.get(tool_name)
         
@@ -65,20 +90,60 @@ class ToolRouter:
         # Execute tool
         return tool(**params)
     
+    def submit_tool(self, tool_call: Dict[str, Any]):
+        """Start a tool on the executor; the future's result carries `seconds`"""
+        return self.executor.submit(self._timed_execute, tool_call)
+    
+    def execute_tools(self, tool_calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Run tool calls concurrently and return their results in call order"""
+        futures = [self.submit_tool(tool_call) for tool_call in tool_calls]
+        return [future.result() for future in futures]
+    
+    def _timed_execute(self, tool_call: Dict[str, Any]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            result = self.execute_tool(tool_call)
+        except Exception as e:
+            result = {
+                "success": False,
+                "error": str(e),
+                "tool": tool_call["tool_name"]
+            }
+        return {**result, "seconds": round(time.perf_counter() - started, 3)}
+    
+    def format_result(self, result: Dict[str, Any]) -> str:
+        """Render a tool result as the tag the model expects"""
+        if result["success"]:
+            return f"<tool_result>{result['formatted']}</tool_result>"
+        return f"<tool_error>{result['error']}</tool_error>"
+    
     def inject_result(self, original_text: str, result: Dict[str, Any]) -> str:
         """Inject tool result back into text"""
-        if result["success"]:
-            result_text = f"<tool_result>{result['formatted']}</tool_result>"
-        else:
-            result_text = f"<tool_error>{result['error']}</tool_error>"
+        result_text = self.format_result(result)
         
         # Replace tool call with result
         injected = re.sub(
             self.tool_call_pattern,
-            result_text,
+            lambda _: result_text,  # Results often contain LaTeX backslashes
             original_text,
             count=1,
             flags=re.DOTALL
         )
         
-        return injected
\ No newline at end of file
+        return injected
+    
+    def inject_results(
+        self,
+        original_text: str,
+        tool_calls: List[Dict[str, Any]],
+        results: List[Dict[str, Any]]
+    ) -> str:
+        """Replace each parsed tool call, in order, with its result"""
+        pending = list(zip(tool_calls, results))
+        
+        def replace(match):
+            if pending and match.group(1) == pending[0][0]["raw_call"]:
+                return self.format_result(pending.pop(0)[1])
+            return match.group(0)  # Unparseable calls are left as written
+        
+        return re.sub(self.tool_call_pattern, replace, original_text, flags=re.DOTALL)
\ No newline at end of file
@@ -1,19 +1,33 @@
 """Wolfram Alpha API integration for advanced computations"""
+import os
 import requests
-import urllib.parse
 from src.tools.base_tool import BaseTool
+from src.tools.http_client import PooledHttpClient, CircuitOpenError, HttpStatusError
 from typing import Dict, Any, Optional
 
 class WolframAlphaTool(BaseTool):
     """Query Wolfram Alpha for complex math, science, and real-world data"""
     
-    def __init__(self, app_id: Optional[str] = None):
+    def __init__(
+        self,
+        app_id: Optional[str] = None,
+        base_url: Optional[str] = None,
+        client: Optional[PooledHttpClient] = None
+    ):
         super().__init__(
             name="wolfram_alpha",
             description="Query Wolfram Alpha for complex math, physics, chemistry, real-world data, unit conversions, and scientific computations"
         )
         self.app_id = app_id
-        self.base_url = "http://api.wolframalpha.com/v2/query"
+        self.base_url = base_url or os.getenv('WOLFRAM_API_URL', "http://api.wolframalpha.com/v2/query")
+        # Queries are paid: successful responses are cached for a week at the HTTP
+        # layer (so get_step_by_step and repeated calls reuse them); failures are not
+        self.client = client or PooledHttpClient(
+            name="wolfram_alpha",
+            timeout=15,
+            max_concurrency=int(os.getenv('WOLFRAM_MAX_CONCURRENCY', '4')),
+            cache_ttl_seconds=7 * 24 * 3600
+        )
         
         if not self.app_id:
             print("⚠️  Wolfram Alpha: No API key provided. Tool will be non-functional.")
@@ -49,16 +63,12 @@ class WolframAlphaTool(BaseTool):
         
         try:
             print(f"🔍 Querying Wolfram Alpha: {query}")
-            response = requests.get(self.base_url, params=params, timeout=15)
-            
-            if response.status_code != 200:
-                return {
-                    "query": query,
-                    "error": f"API request failed with status {response.status_code}",
-                    "success": False
-                }
-            
-            data = response.json()
+            data = self.client.get_json(
+                self.base_url,
+                params,
+                cache_params={k: v for k, v in params.items() if k != 'appid'},
+                cacheable=lambda body: body.get('queryresult', {}).get('success', False)
+            )
             
             # Parse results
             if 'queryresult' not in data:
@@ -113,6 +123,20 @@ class WolframAlphaTool(BaseTool):
                 "timing": query_result.get('timing', 0)
             }
         
+        except CircuitOpenError:
+            return {
+                "query": query,
+                "error": "Wolfram Alpha is temporarily unavailable (too many recent failures)",
+                "success": False
+            }
+        
+        except HttpStatusError as e:
+            return {
+                "query": query,
+                "error": str(e),
+                "success": False
+            }
+        
         except requests.Timeout:
             return {
                 "query": query,
@@ -169,7 +193,8 @@ class WolframAlphaTool(BaseTool):
             query: Math problem query
         """
         # Wolfram Alpha provides step-by-step for Pro API only
-        # This is a wrapper that attempts to extract steps from results
+        # This is a wrapper that attempts to extract steps from results; the
+        # response is served from the client cache if the query was just made
         result = self.execute(query)
         
         if not result.get('success'):
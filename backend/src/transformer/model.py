@@ -1,8 +1,71 @@
 """Model loading with LoRA adapter support"""
+import hashlib
+import json
+import shutil
+import threading
+import time
 import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer
+from transformers import AutoConfig, AutoModelForCausalLM, AutoTokenizer
 from peft import PeftModel, PeftConfig
 import os
+from typing import Dict, Optional
+
+# PEFT's name for "no adapter" in mixed-adapter batches
+BASE_ADAPTER = "__base__"
+MANIFEST_FILE = "merge_manifest.json"
+# bf16: full weights; int8: dynamic int8 linears (CPU); int4: weight-only int4 via torchao (CPU)
+PRECISIONS = ("bf16", "int8", "int4")
+
+def hash_directory(path: str) -> str:
+    """Content hash of every file in a directory (e.g. adapter weights + config)"""
+    digest = hashlib.sha256()
+    for name in sorted(os.listdir(path)):
+        file_path = os.path.join(path, name)
+        if not os.path.isfile(file_path):
+            continue
+        digest.update(name.encode())
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+def _float_output(module, inputs, output):
+    """Forward hook: bf16 embeddings feed the float32 layers of an int8 model"""
+    return output.float()
+
+def _quantize_linears_int8(model):
+    """Dynamic int8 quantization that never holds a float32 copy of the model.
+    
+    Each nn.Linear is converted from its own bf16 weights, one layer at a
+    time (dynamic int8 GEMMs run on float32 activations). The embedding
+    table, the largest tensor, stays bf16 and its output is upcast.
+    """
+    embeddings = model.get_input_embeddings()
+    qconfig = torch.ao.quantization.default_dynamic_qconfig
+    for module in list(model.modules()):
+        for name, child in list(module.named_children()):
+            if not isinstance(child, torch.nn.Linear):
+                continue
+            # A float copy, so a weight tied to the embeddings is left untouched
+            float_linear = torch.nn.Linear(
+                child.in_features, child.out_features, bias=child.bias is not None, device="meta"
+            )
+            float_linear.weight = torch.nn.Parameter(child.weight.detach().float(), requires_grad=False)
+            if child.bias is not None:
+                float_linear.bias = torch.nn.Parameter(child.bias.detach().float(), requires_grad=False)
+            float_linear.qconfig = qconfig
+            setattr(module, name, torch.ao.nn.quantized.dynamic.Linear.from_float(float_linear))
+    
+    # What is left besides the embeddings (norms, rotary buffers) is small
+    for module in model.modules():
+        if module is embeddings:
+            continue
+        for tensors in (module._parameters, module._buffers):
+            for name, tensor in tensors.items():
+                if tensor is not None and tensor.is_floating_point():
+                    tensor.data = tensor.data.float()
+    embeddings.register_forward_hook(_float_output)
+    return model
 
 class MathTransformerModel:
     """Wrapper for the Qwen2.5-Math model with LoRA"""
@@ -11,47 +74,179 @@ class MathTransformerModel:
         self, 
         base_model_id="Qwen/Qwen2.5-Math-1.5B-Instruct",
         lora_adapter_path=".\models\lora_adapter",  # Path to your fine-tuned LoRA weights
-        device=None
+        device=None,
+        merged_cache_dir=None,  # Cache merged base+LoRA weights here and boot from them
+        precision="bf16",
+        quantized_cache_dir=None  # Cache quantized weights here so boots skip quantization
     ):
         self.base_model_id = base_model_id
         self.lora_adapter_path = lora_adapter_path
         self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        # Held around forward passes and adapter changes, which mutate the model
+        self.lock = threading.RLock()
+        self.adapters: Dict[str, str] = {}  # Adapter name -> path
+        self.default_adapter = BASE_ADAPTER
+        self.merged_adapter_path = None  # Adapter baked into the base weights, if any
+        self.precision = precision
+        self._base_version = None
+        self._path_hashes: Dict[str, str] = {}  # Adapter path -> content hash
+        
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision: {precision} (expected one of {PRECISIONS})")
+        if precision != "bf16" and self.device != "cpu":
+            raise ValueError(f"{precision} precision is only supported on CPU")
+        
+        has_adapter = bool(lora_adapter_path) and os.path.exists(lora_adapter_path)
+        artifact_dir = None
+        if merged_cache_dir and has_adapter:
+            artifact_dir = os.path.join(merged_cache_dir, self.artifact_name())
+        quantized_path = None
+        if precision != "bf16" and quantized_cache_dir:
+            quantized_path = os.path.join(
+                quantized_cache_dir,
+                f"{self.artifact_name()}-{precision}-torch{torch.__version__}.pt"
+            )
+        
+        if quantized_path and os.path.exists(quantized_path):
+            print(f"⚡ Loading quantized model: {quantized_path}")
+            self._load_tokenizer(base_model_id)
+            # Trusted local artifact written by _quantize(); it holds packed weights
+            self.base_model = self.model = torch.load(quantized_path, weights_only=False)
+            if has_adapter:
+                self._serve_merged(lora_adapter_path)
+        elif artifact_dir and os.path.exists(os.path.join(artifact_dir, MANIFEST_FILE)):
+            # Weights are memory-mapped from safetensors; no PEFT wrapping or merge needed
+            print(f"⚡ Loading pre-merged model: {artifact_dir}")
+            self._load_base(artifact_dir)
+            self.model = self.base_model
+            self._serve_merged(lora_adapter_path)
+        else:
+            print(f"🔄 Loading base model: {base_model_id}")
+            self._load_base(base_model_id)
+            
+            # Load LoRA adapter if provided
+            if has_adapter:
+                print(f"🔄 Loading LoRA adapter from: {lora_adapter_path}")
+                self.model = PeftModel.from_pretrained(
+                    self.base_model,
+                    lora_adapter_path,
+                    adapter_name="default",
+                    torch_dtype=torch.bfloat16
+                )
+                self.adapters["default"] = lora_adapter_path
+                self.default_adapter = "default"
+                print("✅ LoRA adapter loaded successfully!")
+            else:
+                self.model = self.base_model
+                if lora_adapter_path:
+                    print(f"⚠️  LoRA path not found: {lora_adapter_path}")
+                    print("📌 Using base model without LoRA")
+            
+            if artifact_dir:
+                self._build_merged_artifact(artifact_dir)
         
-        print(f"🔄 Loading base model: {base_model_id}")
+        if precision != "bf16" and not (quantized_path and os.path.exists(quantized_path)):
+            self._quantize(precision, quantized_path)
         
-        # Load tokenizer
+        self.model.eval()  # Set to evaluation mode
+        print(f"✅ Model loaded on {self.device}")
+    
+    def _load_tokenizer(self, source):
+        """Load the tokenizer from a hub ID or a local directory"""
         self.tokenizer = AutoTokenizer.from_pretrained(
-            base_model_id, 
+            source, 
             trust_remote_code=True,
             padding_side="left"
         )
         self.tokenizer.pad_token_id = self.tokenizer.eos_token_id
+    
+    def _load_base(self, source):
+        """Load tokenizer and weights from a hub ID or a local directory"""
+        self._load_tokenizer(source)
         
         # Load base model
         self.base_model = AutoModelForCausalLM.from_pretrained(
-            base_model_id,
+            source,
             torch_dtype=torch.bfloat16,
             trust_remote_code=True,
+            low_cpu_mem_usage=True,
             device_map="auto" if torch.cuda.is_available() else None
         )
-        
-        # Load LoRA adapter if provided
-        if lora_adapter_path and os.path.exists(lora_adapter_path):
-            print(f"🔄 Loading LoRA adapter from: {lora_adapter_path}")
-            self.model = PeftModel.from_pretrained(
-                self.base_model,
-                lora_adapter_path,
-                torch_dtype=torch.bfloat16
-            )
-            print("✅ LoRA adapter loaded successfully!")
+    
+    def base_version(self) -> str:
+        """Hash of the base model's hub revision and config"""
+        if self._base_version is None:
+            config = AutoConfig.from_pretrained(self.base_model_id, trust_remote_code=True)
+            base_digest = hashlib.sha256()
+            base_digest.update(self.base_model_id.encode())
+            base_digest.update(str(getattr(config, "_commit_hash", None)).encode())
+            base_digest.update(config.to_json_string().encode())
+            self._base_version = base_digest.hexdigest()
+        return self._base_version
+    
+    def artifact_name(self) -> str:
+        """Versioned name of cached artifacts for this base model + adapter"""
+        if self.lora_adapter_path and os.path.exists(self.lora_adapter_path):
+            adapter_hash = self._adapter_hash(self.lora_adapter_path)
         else:
-            self.model = self.base_model
-            if lora_adapter_path:
-                print(f"⚠️  LoRA path not found: {lora_adapter_path}")
-                print("📌 Using base model without LoRA")
+            adapter_hash = "base"
+        slug = self.base_model_id.replace("/", "--")
+        return f"{slug}-{self.base_version()[:12]}-{adapter_hash[:12]}"
+    
+    def model_version(self, adapter: Optional[str] = None) -> str:
+        """Identifies the weights that serve `adapter`.
         
-        self.model.eval()  # Set to evaluation mode
-        print(f"✅ Model loaded on {self.device}")
+        Changes with the base revision, the precision, the merged adapter's
+        files and the selected adapter's files.
+        """
+        adapter = self.resolve_adapter(adapter)
+        parts = [self.base_model_id, self.base_version()[:12], self.precision]
+        if self.merged_adapter_path:
+            parts.append("merged:" + self._adapter_hash(self.merged_adapter_path)[:12])
+        if adapter != BASE_ADAPTER and self.adapters[adapter] != self.merged_adapter_path:
+            parts.append(f"{adapter}:" + self._adapter_hash(self.adapters[adapter])[:12])
+        return "/".join(parts)
+    
+    def _adapter_hash(self, path: str) -> str:
+        if path not in self._path_hashes:
+            self._path_hashes[path] = hash_directory(path)
+        return self._path_hashes[path]
+    
+    def _build_merged_artifact(self, artifact_dir):
+        """Merge the startup adapter once and save it for later boots"""
+        # Write to a temporary directory first so concurrent boots never see a partial artifact
+        tmp_dir = f"{artifact_dir}.tmp-{os.getpid()}"
+        merged_model = self.merge_and_save(tmp_dir)
+        with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w') as f:
+            json.dump({
+                "base_model_id": self.base_model_id,
+                "adapter_path": self.lora_adapter_path,
+                "adapter_hash": self._adapter_hash(self.lora_adapter_path),
+                "created_at": time.time()
+            }, f, indent=2)
+        try:
+            os.rename(tmp_dir, artifact_dir)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)  # Another process won the race
+        
+        # Serve the merged weights right away; the adapter is now part of the base
+        self.base_model = self.model = merged_model
+        self._serve_merged(self.lora_adapter_path)
+    
+    def _serve_merged(self, adapter_path):
+        """Serve weights with the startup adapter merged in.
+        
+        "default" keeps naming the fine-tune (now the plain model). The
+        unmodified base no longer exists, so __base__ is rejected, and no
+        LoRA adapters can be stacked on the merged weights.
+        """
+        self.merged_adapter_path = adapter_path
+        self.adapters = {"default": adapter_path}
+        self.default_adapter = "default"
+    
+    def is_merged(self) -> bool:
+        """Whether the startup adapter is baked into the served weights"""
+        return self.merged_adapter_path is not None
     
     def get_model(self):
         """Return the model (with LoRA if loaded)"""
@@ -61,6 +256,104 @@ class MathTransformerModel:
         """Return the tokenizer"""
         return self.tokenizer
     
+    def _quantize(self, precision, save_path=None):
+        """Merge any adapter into the weights, then quantize the linear layers"""
+        if self.is_peft():
+            print("🔄 Merging LoRA weights before quantization...")
+            self.model = self.model.merge_and_unload()
+            self._serve_merged(self.lora_adapter_path)
+        
+        print(f"🔄 Quantizing linear layers to {precision}...")
+        if precision == "int8":
+            model = _quantize_linears_int8(self.model)
+        else:
+            try:
+                from torchao.quantization import quantize_, Int4WeightOnlyConfig
+                from torchao.dtypes import Int4CPULayout
+            except ImportError:
+                raise ImportError("int4 precision requires torchao: pip install torchao")
+            model = self.model
+            quantize_(model, Int4WeightOnlyConfig(group_size=128, layout=Int4CPULayout()))
+        self.base_model = self.model = model.eval()
+        
+        if save_path:
+            os.makedirs(os.path.dirname(save_path) or ".", exist_ok=True)
+            tmp_path = f"{save_path}.tmp-{os.getpid()}"
+            torch.save(self.model, tmp_path)
+            os.replace(tmp_path, save_path)
+            print(f"✅ Quantized model saved to: {save_path}")
+    
+    def is_peft(self) -> bool:
+        """Whether LoRA adapters are attached to the model"""
+        return isinstance(self.model, PeftModel)
+    
+    def list_adapters(self) -> Dict[str, str]:
+        """Loaded adapters by name"""
+        return dict(self.adapters)
+    
+    def resolve_adapter(self, name: Optional[str] = None) -> str:
+        """Map a requested adapter to a loaded one (None -> startup default)"""
+        if name is None:
+            return self.default_adapter
+        if name == BASE_ADAPTER and self.is_merged():
+            raise ValueError("The base model is not available: the LoRA adapter is merged into the weights")
+        if name == BASE_ADAPTER or name in self.adapters:
+            return name
+        raise ValueError(f"Unknown adapter: {name}")
+    
+    def adapter_kwargs(self, adapter_names) -> Dict:
+        """Forward/generate kwargs selecting an adapter for every batch row"""
+        # Merged weights serve "default" with no adapter attached
+        if not self.is_peft():
+            return {}
+        return {"adapter_names": list(adapter_names)}
+    
+    def load_adapter(self, name: str, path: str):
+        """Attach another LoRA adapter without reloading the base weights"""
+        if self.precision != "bf16":
+            raise ValueError(f"Runtime adapters are not supported with {self.precision} precision")
+        if self.is_merged():
+            raise ValueError("Runtime adapters are not supported while serving merged weights")
+        if name == BASE_ADAPTER or name in self.adapters:
+            raise ValueError(f"Adapter already loaded: {name}")
+        if not os.path.exists(path):
+            raise ValueError(f"LoRA path not found: {path}")
+        
+        print(f"🔄 Loading LoRA adapter '{name}' from: {path}")
+        self._path_hashes.pop(path, None)  # The files may have changed since last time
+        with self.lock:
+            if self.is_peft():
+                self.model.load_adapter(path, adapter_name=name)
+            else:
+                self.model = PeftModel.from_pretrained(
+                    self.base_model,
+                    path,
+                    adapter_name=name,
+                    torch_dtype=torch.bfloat16
+                )
+            self.model.eval()
+            self.adapters[name] = path
+        print(f"✅ LoRA adapter '{name}' loaded")
+    
+    def unload_adapter(self, name: str):
+        """Detach a LoRA adapter; the base weights stay in memory"""
+        if name not in self.adapters:
+            raise ValueError(f"Unknown adapter: {name}")
+        if self.is_merged():
+            raise ValueError(f"Adapter '{name}' is merged into the weights and cannot be unloaded")
+        
+        with self.lock:
+            if len(self.adapters) == 1:
+                # Removing the last adapter leaves the plain base model
+                self.model = self.model.unload()
+                self.model.eval()
+            else:
+                self.model.delete_adapter(name)
+            del self.adapters[name]
+            if self.default_adapter == name:
+                self.default_adapter = BASE_ADAPTER
+        print(f"🗑️  Unloaded LoRA adapter: {name}")
+    
     def get_eos_token_id(self):
         """Get the end-of-sequence token ID"""
         return self.tokenizer.convert_tokens_to_ids("<|im_end|>")
@@ -70,8 +363,9 @@ class MathTransformerModel:
         if isinstance(self.model, PeftModel):
             print(f"🔄 Merging LoRA weights with base model...")
             merged_model = self.model.merge_and_unload()
-            merged_model.save_pretrained(output_path)
+            merged_model.save_pretrained(output_path, safe_serialization=True)
             self.tokenizer.save_pretrained(output_path)
             print(f"✅ Merged model saved to: {output_path}")
+            return merged_model
         else:
             print("⚠️  No LoRA adapter to merge")
\ No newline at end of file
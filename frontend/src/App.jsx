@@ -17,6 +17,8 @@ export default function App() {
   const [isLoading, setIsLoading] = useState(false);
   const messagesEndRef = useRef(null);
   const textareaRef = useRef(null);
+  // One backend conversation per page load
+  const sessionIdRef = useRef(crypto.randomUUID());
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
@@ -28,7 +30,11 @@ export default function App() {
 
   useEffect(() => {
     // Clear backend memory on page load
-    fetch('http://localhost:8000/reset', { method: 'POST' }).catch(console.error);
+    fetch('http://localhost:8000/reset', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ session_id: sessionIdRef.current }),
+    }).catch(console.error);
   }, []);
 
   const handleSend = async () => {
@@ -51,7 +57,8 @@ export default function App() {
         body: JSON.stringify({
           problem: currentInput,
           max_tokens: 2048,
-          temperature: 0.7
+          temperature: 0.7,
+          session_id: sessionIdRef.current
         }),
       });
 